@@ -1,8 +1,8 @@
 import streamlit as st
-import os
-from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+from dv360_tool.auth import SCOPES, default_credentials
+
 st.set_page_config(
     page_title="DV360 Creative Updater",
     page_icon="🔧",
@@ -11,8 +11,6 @@ st.set_page_config(
 
 st.title("Welcome to the DV360 Creative Updater")
 
-SCOPES = ['https://www.googleapis.com/auth/display-video']
-
 # --- Authentication Logic ---
 def get_creds():
     # This function now correctly handles the login flow on the main page.
@@ -21,16 +19,16 @@ def get_creds():
         st.info("Please navigate to the **Bulk Update** page in the sidebar to begin.")
         return st.session_state.creds
         
-    if os.path.exists('token.json'):
-        try:
-            creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-            if creds and creds.valid:
-                st.session_state.creds = creds
-                st.success("You are logged in.")
-                st.info("Please navigate to the **Bulk Update** page in the sidebar to begin.")
-                return creds
-        except Exception as e:
-            st.warning(f"Could not load token.json: {e}. Please re-authenticate.")
+    try:
+        # Shared with the pages: refreshed ahead of expiry and saved back to token.json.
+        creds = default_credentials().get()
+        if creds:
+            st.session_state.creds = creds
+            st.success("You are logged in.")
+            st.info("Please navigate to the **Bulk Update** page in the sidebar to begin.")
+            return creds
+    except Exception as e:
+        st.warning(f"Could not load token.json: {e}. Please re-authenticate.")
 
     try:
         # This assumes you have your client_secret.json details in st.secrets
@@ -50,9 +48,7 @@ def get_creds():
     if auth_code:
         try:
             flow.fetch_token(code=auth_code)
-            creds = flow.credentials
-            with open('token.json', 'w') as token:
-                token.write(creds.to_json())
+            creds = default_credentials().store(flow.credentials)
             st.session_state.creds = creds
             st.success("Authentication successful!")
             st.info("Please navigate to the **Bulk Update** page in the sidebar.")
@@ -0,0 +1,389 @@
+"""Local stand-in for the DV360 `advertisers.creatives` endpoints, for benchmarks and offline testing.
+
+    python -m bench.mock_server --port 8765 --advertisers 10 --creatives 1000 --latency-ms 20 --quota-rate 0.01
+    DV360_API_ENDPOINT=http://127.0.0.1:8765 python -m dv360_tool export --ids pairs.csv --out trackers.csv
+
+Serves get, list (with `pageToken` pagination and `creativeId`,
+`creativeType` and `entityStatus` filters, rejecting more than one
+`entityStatus` restriction as DV360 does), patch and batch requests over
+deterministic generated creatives. Latency, 5xx errors and 429 quota
+responses are injected per call; patches are kept in memory. `GET /_stats`
+returns the recorded latencies and status counts.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from dataclasses import dataclass
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIRST_ADVERTISER_ID = 1000
+CREATIVE_ID_STRIDE = 10_000_000
+TRACKER_TYPES = [
+    "THIRD_PARTY_URL_TYPE_IMPRESSION",
+    "THIRD_PARTY_URL_TYPE_CLICK_TRACKING",
+    "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_START",
+    "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_COMPLETE",
+]
+TRACKER_DOMAINS = ["ad.old-vendor.example", "px.measure.example"]
+
+# Not part of the API: returns the recorded stats as JSON (and clears them with ?reset=1).
+STATS_PATH = '/_stats'
+
+CREATIVE_PATH = re.compile(r'^/v3/advertisers/(\d+)/creatives(?:/(\d+))?$')
+FILTER_TERM = re.compile(r'(creativeId|creativeType|entityStatus)\s*=\s*"?([\w-]+)"?')
+# Fields DV360 accepts at most one restriction on in a list filter.
+SINGLE_RESTRICTION_FIELDS = {'entityStatus'}
+
+
+@dataclass
+class MockConfig:
+    """Size of the generated data and the faults to inject."""
+    advertisers: int = 10
+    creatives_per_advertiser: int = 1000
+    trackers_per_creative: int = 4
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    quota_rate: float = 0.0
+    max_page_size: int = 200
+    seed: int = 0
+
+
+class MockStats:
+    """Per-request latencies and per-call status and method counts, safe to update from handler threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies, self.statuses, self.methods = [], Counter(), Counter()
+
+    def reset(self):
+        self.snapshot(reset=True)
+
+    def record_request(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def record_call(self, method, status):
+        with self._lock:
+            self.methods[method] += 1
+            self.statuses[status] += 1
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            snapshot = list(self.latencies), Counter(self.statuses), Counter(self.methods)
+            if reset:
+                self.latencies, self.statuses, self.methods = [], Counter(), Counter()
+            return snapshot
+
+
+class MockStore:
+    """Generated creatives plus the patches applied to them."""
+
+    def __init__(self, config):
+        self.config = config
+        self._patched = {}
+        self._lock = threading.Lock()
+
+    def advertiser_ids(self):
+        return [str(FIRST_ADVERTISER_ID + i) for i in range(self.config.advertisers)]
+
+    def creative_ids(self, advertiser_id):
+        base = int(advertiser_id) * CREATIVE_ID_STRIDE
+        return [str(base + n) for n in range(self.config.creatives_per_advertiser)]
+
+    def pairs(self, count):
+        """The first `count` `(advertiser_id, creative_id)` pairs, spread evenly over the advertisers."""
+        advertisers = self.advertiser_ids()
+        per_advertiser = self.config.creatives_per_advertiser
+        count = min(count, len(advertisers) * per_advertiser)
+        return [
+            (advertisers[i % len(advertisers)],
+             str(int(advertisers[i % len(advertisers)]) * CREATIVE_ID_STRIDE + i // len(advertisers)))
+            for i in range(count)
+        ]
+
+    def _exists(self, advertiser_id, creative_id):
+        index = int(creative_id) - int(advertiser_id) * CREATIVE_ID_STRIDE
+        return (0 <= int(advertiser_id) - FIRST_ADVERTISER_ID < self.config.advertisers
+                and 0 <= index < self.config.creatives_per_advertiser)
+
+    def _generate(self, advertiser_id, creative_id):
+        index = int(creative_id) - int(advertiser_id) * CREATIVE_ID_STRIDE
+        creative = {
+            'name': f"advertisers/{advertiser_id}/creatives/{creative_id}",
+            'advertiserId': advertiser_id,
+            'creativeId': creative_id,
+            'displayName': f"Creative {creative_id}",
+            'entityStatus': "ENTITY_STATUS_PAUSED" if index % 10 == 9 else "ENTITY_STATUS_ACTIVE",
+            'creativeType': "CREATIVE_TYPE_VIDEO",
+            'hostingSource': "HOSTING_SOURCE_HOSTED",
+            'dimensions': {'widthPixels': 1920, 'heightPixels': 1080},
+            'updateTime': "2026-01-01T00:00:00Z",
+            'thirdPartyUrls': [
+                {
+                    'type': TRACKER_TYPES[k % len(TRACKER_TYPES)],
+                    'url': f"https://{TRACKER_DOMAINS[(index + k) % len(TRACKER_DOMAINS)]}/px/{creative_id}/{k}?cb=1",
+                }
+                for k in range(self.config.trackers_per_creative)
+            ],
+        }
+        with self._lock:
+            creative.update(self._patched.get((advertiser_id, creative_id), {}))
+        return creative
+
+    def get(self, advertiser_id, creative_id):
+        if not self._exists(advertiser_id, creative_id):
+            return None
+        return self._generate(advertiser_id, creative_id)
+
+    def list(self, advertiser_id, filter_str='', page_size=100, page_token=''):
+        terms = {}
+        for field, value in FILTER_TERM.findall(filter_str or ''):
+            if field in SINGLE_RESTRICTION_FIELDS and field in terms:
+                raise ValueError(f"Filter may have at most one restriction on {field}.")
+            terms.setdefault(field, set()).add(value)
+        if 'creativeId' in terms:
+            ids = sorted(c for c in terms['creativeId'] if self._exists(advertiser_id, c))
+        else:
+            ids = self.creative_ids(advertiser_id)
+        start = int(page_token or 0)
+        page_size = max(1, min(int(page_size), self.config.max_page_size))
+        creatives = []
+        position = start
+        while position < len(ids) and len(creatives) < page_size:
+            creative = self._generate(advertiser_id, ids[position])
+            position += 1
+            if all(creative.get(field) in values for field, values in terms.items() if field != 'creativeId'):
+                creatives.append(creative)
+        response = {'creatives': creatives} if creatives else {}
+        if position < len(ids):
+            response['nextPageToken'] = str(position)
+        return response
+
+    def patch(self, advertiser_id, creative_id, body, update_mask):
+        if not self._exists(advertiser_id, creative_id):
+            return None
+        changes = {field: body[field] for field in (update_mask or '').split(',') if field in body}
+        changes['updateTime'] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with self._lock:
+            self._patched.setdefault((advertiser_id, creative_id), {}).update(changes)
+        return self._generate(advertiser_id, creative_id)
+
+
+def _error(status, message, reason):
+    return status, {'error': {'code': status, 'message': message, 'status': reason}}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this, keep-alive
+    # connections stall on delayed ACKs and the benchmark measures the kernel.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body, content_type="application/json; charset=UTF-8"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _wait(self):
+        config = self.server.store.config
+        delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _handle(self, method, target, body):
+        """Routes one API call; returns `(status, json_body)`."""
+        config = self.server.store.config
+        url = urlsplit(target)
+        match = CREATIVE_PATH.match(url.path)
+        if not match:
+            status, response = _error(404, f"Unknown path {url.path}", "NOT_FOUND")
+            self.server.stats.record_call(method, status)
+            return status, response
+        kind = {('GET', False): 'list', ('GET', True): 'get', ('PATCH', True): 'patch'}.get((method, bool(match[2])))
+        roll = random.random()
+        if kind is None:
+            status, response = _error(405, f"{method} is not supported here", "UNIMPLEMENTED")
+        elif roll < config.quota_rate:
+            status, response = _error(429, "Quota exceeded for quota metric 'Read requests'", "RESOURCE_EXHAUSTED")
+        elif roll < config.quota_rate + config.error_rate:
+            status, response = _error(503, "The service is currently unavailable.", "UNAVAILABLE")
+        else:
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            store = self.server.store
+            status = 200
+            if kind == 'list':
+                try:
+                    response = store.list(match[1], query.get('filter', ''), query.get('pageSize', 100),
+                                          query.get('pageToken', ''))
+                except ValueError as e:
+                    status, response = _error(400, str(e), "INVALID_ARGUMENT")
+            elif kind == 'get':
+                response = store.get(match[1], match[2])
+            else:
+                response = store.patch(match[1], match[2], json.loads(body or b'{}'), query.get('updateMask'))
+            if response is None:
+                status, response = _error(404, "Requested entity was not found.", "NOT_FOUND")
+        self.server.stats.record_call(kind or method, status)
+        return status, response
+
+    def _api(self, method):
+        started = time.perf_counter()
+        body = self._read_body()
+        self._wait()
+        status, response = self._handle(method, self.path, body)
+        self._send(status, response)
+        self.server.stats.record_request(time.perf_counter() - started)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == STATS_PATH:
+            latencies, statuses, methods = self.server.stats.snapshot(reset='reset' in parse_qs(url.query))
+            self._send(200, {'latencies': latencies, 'statuses': statuses, 'methods': methods})
+            return
+        self._api('GET')
+
+    def do_PATCH(self):
+        self._api('PATCH')
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/batch':
+            self._api('POST')
+            return
+        started = time.perf_counter()
+        body = self._read_body()
+        self._wait()
+        message = BytesParser().parsebytes(
+            b"Content-Type: " + self.headers['Content-Type'].encode('ascii') + b"\r\n\r\n" + body
+        )
+        boundary = f"batch_{random.getrandbits(64):016x}"
+        parts = []
+        for part in message.get_payload():
+            request = part.get_payload()
+            head, _, inner_body = request.replace('\r\n', '\n').partition('\n\n')
+            method, target = head.split('\n', 1)[0].split(' ')[:2]
+            status, response = self._handle(method, target, inner_body.encode('utf-8'))
+            content_id = part['Content-ID'].strip('<>')
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {self.responses.get(status, ('',))[0]}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(response)}\r\n"
+            )
+        payload = (''.join(parts) + f"--{boundary}--\r\n").encode('utf-8')
+        self._send(200, payload, content_type=f"multipart/mixed; boundary={boundary}")
+        self.server.stats.record_request(time.perf_counter() - started)
+
+
+def start_server(config, host="127.0.0.1", port=0):
+    """Starts the stand-in server on a background thread; returns `(server, root_url)`.
+
+    The server has `store` (a `MockStore`) and `stats` (a `MockStats`)
+    attributes; call `server.shutdown()` to stop it.
+    """
+    random.seed(config.seed)
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.store = MockStore(config)
+    server.stats = MockStats()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+
+def config_args(config):
+    """The command-line arguments that start a server with `config`."""
+    return [
+        "--advertisers", str(config.advertisers),
+        "--creatives", str(config.creatives_per_advertiser),
+        "--trackers", str(config.trackers_per_creative),
+        "--latency-ms", str(config.latency_ms),
+        "--jitter-ms", str(config.jitter_ms),
+        "--error-rate", str(config.error_rate),
+        "--quota-rate", str(config.quota_rate),
+        "--page-size", str(config.max_page_size),
+        "--seed", str(config.seed),
+    ]
+
+
+def spawn_server(config):
+    """Starts the server in a child process, so it does not compete with the client for the GIL.
+
+    Returns `(process, root_url)`; stop it with `process.terminate()`.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "bench.mock_server", "--port", "0", *config_args(config)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    match = re.search(r'(http://\S+)', process.stdout.readline())
+    if not match:
+        process.terminate()
+        raise RuntimeError("The stand-in server did not start")
+    return process, match[1]
+
+
+def fetch_stats(root_url, reset=False):
+    """Reads `(latencies, statuses, methods)` from a running server's stats endpoint."""
+    with urllib.request.urlopen(root_url.rstrip('/') + STATS_PATH + ('?reset=1' if reset else '')) as response:
+        stats = json.load(response)
+    return stats['latencies'], Counter({int(k): v for k, v in stats['statuses'].items()}), Counter(stats['methods'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bench.mock_server", description=__doc__.split('\n')[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    parser.add_argument("--advertisers", type=int, default=MockConfig.advertisers)
+    parser.add_argument("--creatives", type=int, default=MockConfig.creatives_per_advertiser,
+                        help="Creatives per advertiser")
+    parser.add_argument("--trackers", type=int, default=MockConfig.trackers_per_creative,
+                        help="Trackers per creative")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with a 503")
+    parser.add_argument("--quota-rate", type=float, default=0.0, help="Share of calls answered with a 429")
+    parser.add_argument("--page-size", type=int, default=MockConfig.max_page_size, help="Largest list page served")
+    parser.add_argument("--seed", type=int, default=MockConfig.seed)
+    args = parser.parse_args(argv)
+    config = MockConfig(
+        advertisers=args.advertisers,
+        creatives_per_advertiser=args.creatives,
+        trackers_per_creative=args.trackers,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        quota_rate=args.quota_rate,
+        max_page_size=args.page_size,
+        seed=args.seed,
+    )
+    server, url = start_server(config, args.host, args.port)
+    print(f"Serving {config.advertisers} advertisers x {config.creatives_per_advertiser} creatives at {url}", flush=True)
+    print(f"Advertiser IDs: {', '.join(server.store.advertiser_ids()[:5])}{'...' if config.advertisers > 5 else ''}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Throughput benchmarks for Phase 1 fetch, Phase 2 parsing and validation, Phase 3 push and the Excel export.
+
+The network phases run against the local stand-in server (bench/mock_server.py),
+started in a child process per size, never against DV360:
+
+    python -m bench.run                                   # 1k and 10k creatives
+    python -m bench.run --sizes 1000 10000 100000 --latency-ms 20 --json results.json
+    python -m bench.run --baseline results.json --max-regression 0.2
+
+Reports throughput, server-side latency percentiles and peak traced memory
+per phase. With `--baseline`, exits with status 1 when a phase got slower
+than the baseline by more than `--max-regression`.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from google.oauth2.credentials import Credentials
+
+from dv360_tool.client import API_ENDPOINT_ENV
+from dv360_tool.engine import RunSettings, plan_job, run_fetch, run_push, run_validate
+from dv360_tool.export import EXCEL_MAX_ROWS, export_file, generate_excel_file
+from dv360_tool.fetch import DEFAULT_MAX_WORKERS
+from dv360_tool.journal import PushJournal
+from dv360_tool.sheets import read_tracker_sheet
+
+from .mock_server import MockConfig, MockStore, fetch_stats, spawn_server
+
+DEFAULT_SIZES = [1000, 10000]
+PHASES = ["fetch", "validate", "push", "excel"]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def measure(fn, trace_memory):
+    """Runs `fn()` and returns `(result, seconds, peak_bytes)`; the peak is None without tracing."""
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = fn()
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+
+def phase_result(size, phase, items, seconds, peak, server_url=None):
+    result = {
+        'size': size,
+        'phase': phase,
+        'items': items,
+        'seconds': round(seconds, 3),
+        'throughput': round(items / seconds, 1) if seconds else None,
+        'peak_mb': round(peak / 1e6, 1) if peak is not None else None,
+    }
+    if server_url is not None:
+        latencies, statuses, methods = fetch_stats(server_url, reset=True)
+        result.update({
+            'requests': len(latencies),
+            'calls': sum(methods.values()),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+            'quota_errors': statuses.get(429, 0),
+            'server_errors': sum(count for status, count in statuses.items() if status >= 500),
+        })
+    return result
+
+
+def run_size(size, args):
+    """Runs every phase for `size` creatives against a fresh stand-in server."""
+    per_advertiser = math.ceil(size / args.advertisers)
+    config = MockConfig(
+        advertisers=args.advertisers,
+        creatives_per_advertiser=per_advertiser,
+        trackers_per_creative=args.trackers,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        quota_rate=args.quota_rate,
+    )
+    server, url = spawn_server(config)
+    os.environ[API_ENDPOINT_ENV] = url
+    # New credentials get a new service pool, so no connection to an earlier server is reused.
+    creds = Credentials(token="bench")
+    settings = RunSettings(
+        max_workers=args.workers,
+        requests_per_second=args.rps,
+        max_retries=args.retries,
+        use_batches=args.batch_size > 0,
+        batch_size=args.batch_size or 1,
+        lookup_mode=args.lookup,
+        use_cache=False,
+    )
+    pairs = MockStore(config).pairs(size)
+    results = []
+    try:
+        (creatives, processed_df, errors), seconds, peak = measure(
+            lambda: run_fetch(creds, pairs, settings), args.trace_memory
+        )
+        results.append(phase_result(size, "fetch", len(pairs), seconds, peak, url))
+        if errors:
+            print(f"  fetch: {len(errors)} creatives failed, e.g. {errors[0][2]}", file=sys.stderr)
+
+        edited_df = processed_df.copy()
+        edited_df['new_url'] = edited_df['existing_url'].str.replace('cb=1', 'cb=2', regex=False)
+        # The edited sheet comes back as an upload, so parsing it is part of the phase.
+        extension = "xlsx" if len(edited_df) <= EXCEL_MAX_ROWS else "csv"
+        data = export_file(edited_df, extension)
+
+        def validate():
+            parsed_df = read_tracker_sheet(data, f"edited.{extension}")
+            run_validate(parsed_df)
+            plan_job(parsed_df)
+            return parsed_df
+
+        plan_df, seconds, peak = measure(validate, args.trace_memory)
+        results.append(phase_result(size, "validate", len(plan_df), seconds, peak))
+
+        journal = PushJournal(os.path.join(tempfile.mkdtemp(prefix="dv360_bench_"), "journal.sqlite"))
+        (_, summary, _), seconds, peak = measure(
+            lambda: run_push(creds, plan_df, settings, creatives, journal=journal), args.trace_memory
+        )
+        results.append(phase_result(size, "push", summary['creatives'], seconds, peak, url))
+        if summary['failed']:
+            print(f"  push: {summary['failed']} creatives failed", file=sys.stderr)
+
+        if len(processed_df) <= EXCEL_MAX_ROWS and not args.skip_excel:
+            _, seconds, peak = measure(lambda: generate_excel_file(processed_df), args.trace_memory)
+            results.append(phase_result(size, "excel", len(processed_df), seconds, peak))
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def print_table(results):
+    columns = ["size", "phase", "items", "seconds", "throughput", "p50_ms", "p95_ms", "p99_ms",
+               "quota_errors", "server_errors", "peak_mb"]
+    rows = [[("" if r.get(c) is None else str(r.get(c))) for c in columns] for r in results]
+    widths = [max(len(c), *(len(row[i]) for row in rows)) for i, c in enumerate(columns)]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(v.rjust(w) for v, w in zip(row, widths)))
+
+
+def regressions(results, baseline, max_regression):
+    """Lists the phases whose throughput dropped below the baseline by more than `max_regression`."""
+    before = {(r['size'], r['phase']): r['throughput'] for r in baseline if r.get('throughput')}
+    slower = []
+    for r in results:
+        old = before.get((r['size'], r['phase']))
+        if old and r['throughput'] is not None and r['throughput'] < old * (1 - max_regression):
+            slower.append(f"{r['phase']} @ {r['size']}: {r['throughput']}/s vs {old}/s")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bench.run", description=__doc__.split('\n')[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Creative counts to run")
+    parser.add_argument("--advertisers", type=int, default=10, help="Advertisers the creatives are spread over")
+    parser.add_argument("--trackers", type=int, default=4, help="Trackers per creative")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Simulated server latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with a 503")
+    parser.add_argument("--quota-rate", type=float, default=0.0, help="Share of calls answered with a 429")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--rps", type=float, default=10000, help="Client rate limit (high by default)")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=0, help="Use batch requests of this size (0: off)")
+    parser.add_argument("--lookup", choices=["get", "list"], default="get")
+    parser.add_argument("--skip-excel", action="store_true")
+    parser.add_argument("--no-memory", dest="trace_memory", action="store_false",
+                        help="Skip tracemalloc, which slows the Python-heavy phases down")
+    parser.add_argument("--json", help="Write the results here")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed throughput drop against the baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    # The creative cache and snapshots live under the working directory, so the
+    # run moves to a scratch one; paths given on the command line stay as meant.
+    json_path = os.path.abspath(args.json) if args.json else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    os.chdir(tempfile.mkdtemp(prefix="dv360_bench_"))
+    results = []
+    for size in args.sizes:
+        print(f"Running {size} creatives...", file=sys.stderr)
+        results.extend(run_size(size, args))
+    print_table(results)
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline_path:
+        with open(baseline_path) as f:
+            slower = regressions(results, json.load(f), args.max_regression)
+        for line in slower:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
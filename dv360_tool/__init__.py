@@ -0,0 +1 @@
+"""Core helpers for the DV360 Creative Updater pages."""
@@ -0,0 +1,156 @@
+import datetime
+import json
+import os
+import tempfile
+import threading
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+SCOPES = ['https://www.googleapis.com/auth/display-video']
+TOKEN_PATH = 'token.json'
+# Access tokens live for an hour; refresh them this long before they run out.
+REFRESH_MARGIN_SECONDS = 5 * 60
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def _utcnow():
+    # google-auth keeps `expiry` as a naive UTC datetime.
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class ManagedCredentials(Credentials):
+    """User credentials that refresh ahead of expiry, one thread at a time.
+
+    Every worker thread's HTTP connection shares one of these, so the first
+    request inside `refresh_margin` of the expiry refreshes the token and the
+    others wait for it instead of refreshing too. `on_refresh(creds)` is
+    called after each refresh, e.g. to save the new token.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh_margin = REFRESH_MARGIN_SECONDS
+        self.on_refresh = None
+        self._refresh_lock = threading.RLock()
+
+    @property
+    def expires_soon(self):
+        if not self.token:
+            return True
+        return self.expiry is not None and self.expiry - datetime.timedelta(seconds=self.refresh_margin) <= _utcnow()
+
+    def refresh_if_needed(self, request=None):
+        """Refreshes the token if it expires within `refresh_margin` and a refresh token is available."""
+        if not (self.expires_soon and self.refresh_token):
+            return
+        with self._refresh_lock:
+            # Another thread may have refreshed while this one waited for the lock.
+            if self.expires_soon:
+                self.refresh(request or Request())
+
+    def refresh(self, request):
+        stale_token = self.token
+        with self._refresh_lock:
+            # Requests rejected together (e.g. concurrent 401s) all land here; only the first refreshes.
+            if self.token != stale_token and not self.expires_soon:
+                return
+            super().refresh(request)
+            if self.on_refresh:
+                self.on_refresh(self)
+
+    def before_request(self, request, method, url, headers):
+        self.refresh_if_needed(request)
+        super().before_request(request, method, url, headers)
+
+
+def save_credentials(creds, path=TOKEN_PATH):
+    """Writes credentials to `path` atomically, so readers never see a half-written token."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.token-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as token:
+            token.write(creds.to_json())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+class CredentialManager:
+    """Hands out one shared, self-refreshing credentials object for a token file.
+
+    The token is read from disk once (and again only if another process
+    rewrote it), refreshed ahead of expiry, and saved back atomically after
+    every refresh. All methods are thread-safe.
+    """
+
+    def __init__(self, path=TOKEN_PATH, refresh_margin=REFRESH_MARGIN_SECONDS):
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self._creds = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _manage(self, info):
+        creds = ManagedCredentials.from_authorized_user_info(info, SCOPES)
+        creds.refresh_margin = self.refresh_margin
+        creds.on_refresh = self._save
+        return creds
+
+    def _save(self, creds):
+        with self._lock:
+            save_credentials(creds, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+    def _load(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                self._creds = None
+                return None
+            mtime = os.stat(self.path).st_mtime_ns
+            if self._creds is None or mtime != self._mtime:
+                with open(self.path) as token:
+                    self._creds = self._manage(json.load(token))
+                self._mtime = mtime
+            return self._creds
+
+    def get(self):
+        """Returns valid credentials, refreshing them first if they expire soon.
+
+        Returns None when there is no usable token; errors reading or
+        refreshing it propagate.
+        """
+        creds = self._load()
+        if creds is None:
+            return None
+        creds.refresh_if_needed()
+        return creds if creds.valid else None
+
+    def store(self, creds):
+        """Takes over freshly authorised credentials (e.g. from the login flow) and saves them."""
+        managed = self._manage(json.loads(creds.to_json()))
+        with self._lock:
+            save_credentials(managed, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+            self._creds = managed
+        return managed
+
+
+def default_credentials():
+    """Returns the process-wide credential manager for `TOKEN_PATH`, shared by the app and its pages."""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = CredentialManager()
+        return _default_manager
+
+
+def load_credentials(path=TOKEN_PATH):
+    """Loads saved user credentials, refreshing and re-saving them if they expire soon.
+
+    Returns None when there is no usable token.
+    """
+    return CredentialManager(path).get()
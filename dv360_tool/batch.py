@@ -0,0 +1,93 @@
+import time
+
+from .metrics import default_metrics, describe_request
+from .retry import DEFAULT_MAX_RETRIES, backoff_delay, error_status, is_quota_error, is_transient
+from .workers import chunked, run_in_pool
+
+# googleapiclient refuses batches larger than this.
+MAX_BATCH_SIZE = 1000
+DEFAULT_BATCH_SIZE = 50
+
+
+def execute_batch(service, requests, limiter=None):
+    """Sends `requests` as one batch HTTP request.
+
+    Returns `(response, error)` pairs in the same order as `requests`. Quota is
+    charged per inner call, so the limiter is asked for one token per request.
+    If the batch itself fails, every item reports that error. Inner calls are
+    counted in the metrics under their own operation; the batch HTTP request
+    itself is timed by the service's HTTP layer.
+    """
+    results = [(None, None)] * len(requests)
+    metrics = default_metrics()
+
+    def callback(request_id, response, exception):
+        results[int(request_id)] = (None, exception) if exception is not None else (response, None)
+        request = requests[int(request_id)]
+        described = describe_request(request.method, request.uri)
+        if described:
+            status = error_status(exception) if exception is not None else 200
+            metrics.record_call(*described, status, quota=exception is not None and is_quota_error(exception))
+
+    batch = service.new_batch_http_request(callback=callback)
+    for i, request in enumerate(requests):
+        batch.add(request, request_id=str(i))
+
+    if limiter:
+        limiter.acquire(len(requests))
+    try:
+        batch.execute()
+    except Exception as e:
+        return [(None, e)] * len(requests)
+    return results
+
+
+def run_batched(service_factory, items, make_request, batch_size, max_workers,
+                limiter=None, max_retries=DEFAULT_MAX_RETRIES, on_progress=None, on_result=None):
+    """Runs `make_request(service, item)` for every item as batch requests.
+
+    Items that fail with a transient error are collected and re-sent in new
+    batches after an exponential backoff, up to `max_retries` rounds; quota
+    errors also slow the shared limiter down. `on_result(index, response,
+    error)` is called once per item when its outcome is final. Returns
+    `(response, error)` pairs in the same order as `items`.
+    """
+    results = [None] * len(items)
+    pending = list(range(len(items)))
+    # (operation, advertiser_id) of each item's request, for counting retries.
+    described = {}
+
+    def work(service, chunk):
+        requests = [make_request(service, items[i]) for i in chunk]
+        for i, request in zip(chunk, requests):
+            described[i] = describe_request(request.method, request.uri)
+        return execute_batch(service, requests, limiter)
+
+    for attempt in range(max_retries + 1):
+        chunks = chunked(pending, batch_size)
+        round_results = run_in_pool(chunks, work, service_factory, max_workers,
+                                    on_progress if attempt == 0 else None, size=len)
+        pending = []
+        quota_hit = False
+        for chunk, chunk_results in zip(chunks, round_results):
+            for i, (response, error) in zip(chunk, chunk_results):
+                if error is not None and attempt < max_retries and is_transient(error):
+                    quota_hit = quota_hit or is_quota_error(error)
+                    pending.append(i)
+                    if described.get(i):
+                        default_metrics().record_retry(*described[i])
+                else:
+                    results[i] = (response, error)
+                    if on_result:
+                        on_result(i, response, error)
+                    if error is None and limiter:
+                        limiter.speed_up()
+        if not pending:
+            break
+        if quota_hit and limiter:
+            limiter.slow_down()
+        time.sleep(backoff_delay(attempt))
+
+    if on_progress and items:
+        on_progress(len(items), len(items))
+    return results
@@ -0,0 +1,71 @@
+"""Searchable, paginated index over fetched trackers for the results view.
+
+The index is built once per fetch; filtering is a few vectorised column
+operations and rendering only ever touches one page of rows.
+"""
+import numpy as np
+import pandas as pd
+
+from .trackers import TRACKER_MAP_HOSTED_VIDEO, reverse_map, url_domain
+
+INDEX_COLUMNS = ["creative_id", "creative_name", "event_type", "domain", "url"]
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+class TrackerIndex:
+    """One row per tracker (or per creative without trackers) with a lower-cased search key."""
+
+    def __init__(self, table):
+        self.table = table.reset_index(drop=True)
+        self._search = (
+            self.table['creative_id'] + '\n' + self.table['creative_name'].str.lower() + '\n' + self.table['domain']
+        )
+        self.event_types = sorted(set(self.table['event_type'].tolist()) - {''})
+        domains = self.table['domain']
+        self.domains = domains[domains != ''].value_counts().index.tolist()
+        self.creative_count = self.table['creative_id'].nunique()
+
+    @classmethod
+    def from_records(cls, creatives, tracker_map=TRACKER_MAP_HOSTED_VIDEO):
+        """Builds the index from `CreativeRecord`s, skipping failed fetches (None)."""
+        labels = reverse_map(tracker_map)
+        domains = {}
+        columns = {column: [] for column in INDEX_COLUMNS}
+        for creative in creatives or []:
+            if not creative:
+                continue
+            for api_type, url in creative.trackers or (('', ''),):
+                host = url.split('/', 3)[2] if url.count('/') >= 2 else url
+                if host not in domains:
+                    domains[host] = url_domain(url)
+                columns['creative_id'].append(creative.creative_id)
+                columns['creative_name'].append(creative.display_name or '')
+                columns['event_type'].append(labels.get(api_type, api_type))
+                columns['domain'].append(domains[host])
+                columns['url'].append(url)
+        return cls(pd.DataFrame(columns, columns=INDEX_COLUMNS, dtype=str))
+
+    def __len__(self):
+        return len(self.table)
+
+    def search(self, query='', event_types=(), domains=()):
+        """Returns the rows whose creative ID, name or domain contains `query` and that match the filters."""
+        mask = np.ones(len(self.table), dtype=bool)
+        query = query.strip().lower()
+        if query:
+            mask &= self._search.str.contains(query, regex=False).to_numpy()
+        if event_types:
+            mask &= self.table['event_type'].isin(event_types).to_numpy()
+        if domains:
+            mask &= self.table['domain'].isin(domains).to_numpy()
+        return self.table[mask]
+
+
+def page_count(rows, page_size):
+    return max(1, -(-len(rows) // page_size))
+
+
+def page_of(rows, page_number, page_size):
+    """Returns the 1-based `page_number` of `rows`."""
+    start = (max(1, page_number) - 1) * page_size
+    return rows.iloc[start:start + page_size]
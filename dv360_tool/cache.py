@@ -0,0 +1,207 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .fetch import DEFAULT_MAX_WORKERS, creative_id_filters, list_creatives
+from .workers import run_in_pool
+
+DEFAULT_CACHE_PATH = os.path.join('.dv360_state', 'creatives.sqlite')
+# Entries younger than this are trusted without asking the API.
+DEFAULT_TTL_SECONDS = 15 * 60
+# Older entries are still reused if their updateTime has not moved, up to this age.
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 50000
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def creative_key(creative):
+    """Returns the (advertiser_id, creative_id) cache key of a creative resource."""
+    return str(creative.get('advertiserId')), str(creative.get('creativeId'))
+
+
+class CreativeCache:
+    """SQLite-backed creative cache with a TTL and size-bounded LRU eviction.
+
+    Entries are keyed by (advertiser_id, creative_id) and remember the
+    creative's `updateTime`, so stale entries can be revalidated cheaply.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL_SECONDS,
+                 max_age=DEFAULT_MAX_AGE_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS creatives ("
+            " advertiser_id TEXT NOT NULL,"
+            " creative_id TEXT NOT NULL,"
+            " update_time TEXT,"
+            " payload TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (advertiser_id, creative_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS creatives_accessed ON creatives (accessed_at)")
+
+    def get_many(self, keys):
+        """Returns `{key: (creative, is_fresh)}` for the keys that are cached.
+
+        Entries past `max_age` are treated as missing.
+        """
+        now = time.time()
+        found = {}
+        keys = [(str(a), str(c)) for a, c in keys]
+        with self._lock:
+            for i in range(0, len(keys), 400):
+                chunk = keys[i:i + 400]
+                where = " OR ".join(["(advertiser_id = ? AND creative_id = ?)"] * len(chunk))
+                params = [part for key in chunk for part in key]
+                rows = self._conn.execute(
+                    f"SELECT advertiser_id, creative_id, payload, fetched_at FROM creatives WHERE {where}", params
+                ).fetchall()
+                for advertiser_id, creative_id, payload, fetched_at in rows:
+                    age = now - fetched_at
+                    if age <= self.max_age:
+                        found[(advertiser_id, creative_id)] = (json.loads(payload), age <= self.ttl)
+            self._conn.executemany(
+                "UPDATE creatives SET accessed_at = ? WHERE advertiser_id = ? AND creative_id = ?",
+                [(now, *key) for key in found]
+            )
+        return found
+
+    def get(self, advertiser_id, creative_id, fresh_only=True):
+        """Returns a cached creative, or None if it is missing (or stale)."""
+        hit = self.get_many([(advertiser_id, creative_id)]).get((str(advertiser_id), str(creative_id)))
+        if hit is None or (fresh_only and not hit[1]):
+            return None
+        return hit[0]
+
+    def put_many(self, creatives):
+        """Stores full or partial creative resources, replacing older entries."""
+        now = time.time()
+        rows = [
+            (*creative_key(creative), creative.get('updateTime'), json.dumps(creative), now, now)
+            for creative in creatives
+            if creative
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO creatives"
+                " (advertiser_id, creative_id, update_time, payload, fetched_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._evict(now)
+
+    def put(self, creative):
+        self.put_many([creative])
+
+    def touch_many(self, keys):
+        """Marks entries as freshly validated without changing their payload."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE creatives SET fetched_at = ?, accessed_at = ? WHERE advertiser_id = ? AND creative_id = ?",
+                [(now, now, str(a), str(c)) for a, c in keys]
+            )
+
+    def invalidate(self, advertiser_id, creative_id):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM creatives WHERE advertiser_id = ? AND creative_id = ?",
+                (str(advertiser_id), str(creative_id))
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM creatives")
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM creatives WHERE fetched_at < ?", (now - self.max_age,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM creatives").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM creatives WHERE rowid IN"
+                " (SELECT rowid FROM creatives ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+
+def default_cache():
+    """Returns the process-wide cache shared by every page and worker thread."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CreativeCache()
+        return _default_cache
+
+
+def fetch_with_cache(cache, fetch, service_factory, advertiser_id, creative_ids,
+                     max_workers=DEFAULT_MAX_WORKERS, limiter=None, on_progress=None, **fetch_kwargs):
+    """Wraps one of the `fetch_*`/`lookup_*` functions with the creative cache.
+
+    Fresh entries are used as they are. Stale entries are revalidated with a
+    filtered list call that only asks for `updateTime`, and are reused if it
+    has not moved. Everything else is fetched with `fetch` and cached.
+    Returns `(details, error)` pairs in the same order as `creative_ids`.
+    """
+    cached = cache.get_many([(advertiser_id, creative_id) for creative_id in creative_ids])
+    hits = {}
+    stale = {}
+    for creative_id in dict.fromkeys(str(c) for c in creative_ids):
+        entry = cached.get((str(advertiser_id), creative_id))
+        if entry is None:
+            continue
+        creative, is_fresh = entry
+        if is_fresh:
+            hits[creative_id] = creative
+        elif creative.get('updateTime'):
+            stale[creative_id] = creative
+
+    if stale:
+        def revalidate(service, task):
+            chunk, filter_str = task
+            try:
+                return {
+                    str(c.get('creativeId')): c.get('updateTime')
+                    for c in list_creatives(service, advertiser_id, filter_str,
+                                            fields="creativeId,updateTime", limiter=limiter)
+                }
+            except Exception:
+                return {}
+
+        update_times = {}
+        for found in run_in_pool(creative_id_filters(list(stale)), revalidate, service_factory, max_workers):
+            update_times.update(found)
+        still_valid = [c for c, creative in stale.items() if update_times.get(c) == creative.get('updateTime')]
+        cache.touch_many([(advertiser_id, c) for c in still_valid])
+        hits.update((c, stale[c]) for c in still_valid)
+
+    misses = [creative_id for creative_id in creative_ids if str(creative_id) not in hits]
+    total = len(creative_ids)
+    offset = total - len(misses)
+    if on_progress and offset:
+        on_progress(offset, total)
+    fetched = fetch(
+        service_factory, advertiser_id, misses, max_workers=max_workers, limiter=limiter,
+        on_progress=(lambda done, _: on_progress(offset + done, total)) if on_progress else None,
+        **fetch_kwargs
+    ) if misses else []
+    cache.put_many([details for details, _ in fetched])
+
+    fetched_by_id = dict(zip((str(c) for c in misses), fetched))
+    return [
+        (hits[str(creative_id)], None) if str(creative_id) in hits else fetched_by_id[str(creative_id)]
+        for creative_id in creative_ids
+    ]
@@ -0,0 +1,278 @@
+"""Command-line interface for running the three phases without Streamlit.
+
+    python -m dv360_tool export --advertiser-id 123 --ids ids.csv --out trackers.xlsx
+    python -m dv360_tool export --ids advertiser_creative_pairs.csv --out trackers.csv.gz
+    python -m dv360_tool discover --advertiser-ids 123,456 --domain old-adserver.com --out trackers.csv
+    python -m dv360_tool rewrite trackers.csv --rules rules.json --out plan.csv --diff diff.csv
+    python -m dv360_tool validate trackers.xlsx
+    python -m dv360_tool push trackers.xlsx --report report.csv
+    python -m dv360_tool push trackers.csv --keep-unlisted
+    python -m dv360_tool jobs
+    python -m dv360_tool snapshots
+    python -m dv360_tool snapshot-diff SNAPSHOT_BEFORE SNAPSHOT_AFTER --out diff.csv
+    python -m dv360_tool rollback SNAPSHOT --out rollback.csv   # then push rollback.csv
+
+Every command prints a JSON summary on stdout.
+"""
+import argparse
+import json
+import sys
+
+from .auth import TOKEN_PATH, load_credentials
+from .batch import DEFAULT_BATCH_SIZE
+from .engine import (
+    LOOKUP_GET, LOOKUP_LIST, RunSettings, fetch_current_state, fresh_job_id, parse_advertiser_ids, parse_id_pairs,
+    run_discover, run_fetch, run_push, run_rewrite, run_rollback, run_snapshot_diff, run_validate
+)
+from .discover import CREATIVE_TYPES, ENTITY_STATUSES, HOSTING_SOURCES, CreativeFilter
+from .export import export_file
+from .fetch import DEFAULT_MAX_WORKERS
+from .journal import default_journal
+from .ratelimit import DEFAULT_REQUESTS_PER_SECOND
+from .retry import DEFAULT_MAX_RETRIES
+from .rules import load_rules
+from .sheets import read_tracker_sheet
+from .snapshots import default_snapshots
+from .trackers import lists_some_trackers
+
+
+def _extension(path):
+    for extension in ("csv.gz", "csv", "xlsx"):
+        if path.endswith("." + extension):
+            return extension
+    raise SystemExit(f"Unsupported file type: {path} (use .xlsx, .csv or .csv.gz)")
+
+
+def _read_sheet(path):
+    _extension(path)
+    with open(path, 'rb') as f:
+        return read_tracker_sheet(f.read(), path)
+
+
+def _write_sheet(df, path, is_report=False):
+    with open(path, 'wb') as f:
+        f.write(export_file(df, _extension(path), is_report=is_report))
+
+
+def _progress(label):
+    def report(done, total):
+        print(f"\r{label}: {done}/{total}", end="" if done < total else "\n", file=sys.stderr, flush=True)
+    return report
+
+
+def _settings(args):
+    return RunSettings(
+        max_workers=args.workers,
+        requests_per_second=args.rps,
+        max_retries=args.retries,
+        use_batches=args.batch_size > 0,
+        batch_size=args.batch_size or DEFAULT_BATCH_SIZE,
+        lookup_mode=args.lookup,
+        use_cache=not args.no_cache,
+    )
+
+
+def _credentials(args):
+    creds = load_credentials(args.token)
+    if creds is None:
+        raise SystemExit(f"No valid credentials in {args.token}; log in through the Streamlit app first.")
+    return creds
+
+
+def cmd_export(args):
+    with open(args.ids, encoding='utf-8') as f:
+        try:
+            pairs = parse_id_pairs(f.read(), args.advertiser_id)
+        except ValueError as e:
+            raise SystemExit(f"{e} Pass --advertiser-id or add an advertiser_id column.")
+    creatives, processed_df, errors = run_fetch(_credentials(args), pairs, _settings(args), _progress("Fetched"))
+    _write_sheet(processed_df, args.out)
+    return {
+        'creatives': len(pairs),
+        'advertisers': len({advertiser_id for advertiser_id, _ in pairs}),
+        'fetched': sum(1 for creative in creatives if creative),
+        'rows': len(processed_df),
+        'output': args.out,
+        'errors': [{'advertiser_id': advertiser_id, 'creative_id': creative_id, 'error': str(error)}
+                   for advertiser_id, creative_id, error in errors],
+    }, 1 if errors else 0
+
+
+def cmd_discover(args):
+    creative_filter = CreativeFilter(
+        domains=tuple(args.domain),
+        url_pattern=args.pattern or '',
+        creative_types=tuple(args.creative_type),
+        hosting_sources=tuple(args.hosting_source),
+        entity_statuses=tuple(args.entity_status),
+    )
+    advertiser_ids = parse_advertiser_ids(args.advertiser_ids)
+    creatives, processed_df, errors, scanned = run_discover(
+        _credentials(args), advertiser_ids, creative_filter, _settings(args), _progress("Advertisers scanned")
+    )
+    _write_sheet(processed_df, args.out)
+    return {
+        'advertisers': len(advertiser_ids),
+        'scanned': scanned,
+        'matched': len(creatives),
+        'rows': len(processed_df),
+        'output': args.out,
+        'errors': [{'advertiser_id': advertiser_id, 'error': str(error)} for advertiser_id, error in errors],
+    }, 1 if errors else 0
+
+
+def cmd_rewrite(args):
+    with open(args.rules, encoding='utf-8') as f:
+        try:
+            rules = load_rules(f.read())
+        except ValueError as e:
+            raise SystemExit(f"{args.rules}: {e}")
+    plan_df, diff_df, counts = run_rewrite(_read_sheet(args.file), rules)
+    _write_sheet(plan_df, args.out)
+    result = dict(counts, rules=len(rules), rows=len(plan_df), output=args.out)
+    if args.diff:
+        _write_sheet(diff_df, args.diff)
+        result['diff'] = args.diff
+    return result, 0
+
+
+def cmd_validate(args):
+    return run_validate(_read_sheet(args.file)), 0
+
+
+def cmd_push(args):
+    creds = _credentials(args)
+    settings = _settings(args)
+    plan_df = _read_sheet(args.file)
+    keep_unlisted = lists_some_trackers(plan_df) if args.keep_unlisted is None else args.keep_unlisted
+    needs_state = args.skip_unchanged or keep_unlisted
+    fetched = fetch_current_state(creds, plan_df, settings, _progress("Fetched")) if needs_state else None
+    job_id = args.job_id or (fresh_job_id(plan_df) if args.fresh else None)
+    report_df, summary, _ = run_push(creds, plan_df, settings, fetched, _progress("Pushed"), job_id=job_id,
+                                     keep_unlisted=keep_unlisted)
+    if args.report:
+        _write_sheet(report_df, args.report, is_report=True)
+        summary['report'] = args.report
+    return summary, 1 if summary['failed'] else 0
+
+
+def cmd_jobs(args):
+    return default_journal().jobs()[:args.limit], 0
+
+
+def cmd_snapshots(args):
+    return default_snapshots().snapshots()[:args.limit], 0
+
+
+def cmd_snapshot_diff(args):
+    try:
+        diff_df = run_snapshot_diff(args.before, args.after)
+    except KeyError as e:
+        raise SystemExit(e.args[0])
+    result = {
+        'creatives': int(diff_df['creative_id'].nunique()),
+        'added': int((diff_df['change'] == 'add').sum()),
+        'deleted': int((diff_df['change'] == 'delete').sum()),
+    }
+    if args.out:
+        _write_sheet(diff_df, args.out)
+        result['output'] = args.out
+    return result, 0
+
+
+def cmd_rollback(args):
+    try:
+        plan_df, _, counts = run_rollback(args.snapshot, args.current)
+    except KeyError as e:
+        raise SystemExit(e.args[0])
+    _write_sheet(plan_df, args.out)
+    return dict(counts, creatives=int(plan_df['creative_id'].nunique()), rows=len(plan_df), output=args.out), 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="dv360_tool", description="Bulk DV360 creative tracker updates.")
+    parser.add_argument("--token", default=TOKEN_PATH, help="Path to the saved OAuth token (default: token.json)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Concurrent requests")
+    parser.add_argument("--rps", type=float, default=DEFAULT_REQUESTS_PER_SECOND, help="Max requests per second")
+    parser.add_argument("--retries", type=int, default=DEFAULT_MAX_RETRIES, help="Retries for transient errors")
+    parser.add_argument("--batch-size", type=int, default=0, help="Group calls into batches of this size (0: off)")
+    parser.add_argument("--lookup", choices=[LOOKUP_GET, LOOKUP_LIST], default=LOOKUP_GET, help="Phase 1 lookup mode")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse cached creatives")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Phase 1: fetch creatives and write the tracker sheet")
+    export.add_argument("--advertiser-id", help="Advertiser for rows of --ids that do not name one")
+    export.add_argument("--ids", required=True,
+                        help="CSV of advertiser_id,creative_id pairs, or one column of creative IDs")
+    export.add_argument("--out", required=True, help="Output sheet (.xlsx, .csv or .csv.gz)")
+    export.set_defaults(func=cmd_export)
+
+    discover = commands.add_parser(
+        "discover", help="Phase 1 without IDs: scan whole advertisers for matching trackers and write the sheet"
+    )
+    discover.add_argument("--advertiser-ids", required=True, help="Comma-separated advertiser IDs")
+    discover.add_argument("--domain", action="append", default=[],
+                          help="Tracker URL domain to look for, subdomains included (repeatable)")
+    discover.add_argument("--pattern", help="Regular expression searched in tracker URLs")
+    discover.add_argument("--creative-type", action="append", default=[], choices=CREATIVE_TYPES)
+    discover.add_argument("--hosting-source", action="append", default=[], choices=HOSTING_SOURCES)
+    discover.add_argument("--entity-status", action="append", default=[], choices=ENTITY_STATUSES)
+    discover.add_argument("--out", required=True,
+                          help="Output sheet (.xlsx, .csv or .csv.gz); push it with --keep-unlisted")
+    discover.set_defaults(func=cmd_discover)
+
+    rewrite = commands.add_parser("rewrite", help="Phase 2 without Excel: apply rewrite rules to a Phase 1 sheet")
+    rewrite.add_argument("file", help="Sheet from export or discover")
+    rewrite.add_argument("--rules", required=True,
+                         help="JSON list of {action, event_type, find, replace, regex} rules, applied in order")
+    rewrite.add_argument("--out", required=True, help="Plan sheet to push (.xlsx, .csv or .csv.gz)")
+    rewrite.add_argument("--diff", help="Also write the preview diff here")
+    rewrite.set_defaults(func=cmd_rewrite)
+
+    validate = commands.add_parser("validate", help="Phase 2: summarise the changes in an edited sheet")
+    validate.add_argument("file")
+    validate.set_defaults(func=cmd_validate)
+
+    push = commands.add_parser("push", help="Phase 3: send an edited sheet to DV360")
+    push.add_argument("file")
+    push.add_argument("--report", help="Write the upload status report here (.xlsx, .csv or .csv.gz)")
+    push.add_argument("--skip-unchanged", action="store_true",
+                      help="Fetch the current trackers first and skip creatives whose list would not change")
+    push.add_argument("--keep-unlisted", action="store_true", default=None,
+                      help="The sheet lists only some trackers: keep the others (default for sheets from discover)")
+    push.add_argument("--no-keep-unlisted", dest="keep_unlisted", action="store_false",
+                      help="Remove the trackers a sheet from discover leaves out")
+    push.add_argument("--job-id",
+                      help="Journal job to resume (default: the plan's earlier job while it has pending or failed "
+                           "creatives, else a new one)")
+    push.add_argument("--fresh", action="store_true", help="Start a new job instead of resuming an earlier one")
+    push.set_defaults(func=cmd_push)
+
+    jobs = commands.add_parser("jobs", help="List journalled Phase 3 jobs and their per-status counts")
+    jobs.add_argument("--limit", type=int, default=20)
+    jobs.set_defaults(func=cmd_jobs)
+
+    snapshots = commands.add_parser("snapshots", help="List the tracker snapshots saved by fetches and pushes")
+    snapshots.add_argument("--limit", type=int, default=20)
+    snapshots.set_defaults(func=cmd_snapshots)
+
+    snapshot_diff = commands.add_parser("snapshot-diff", help="List the trackers added and removed between two snapshots")
+    snapshot_diff.add_argument("before")
+    snapshot_diff.add_argument("after")
+    snapshot_diff.add_argument("--out", help="Write the diff here (.xlsx, .csv or .csv.gz)")
+    snapshot_diff.set_defaults(func=cmd_snapshot_diff)
+
+    rollback = commands.add_parser("rollback", help="Write a Phase 3 plan that restores a snapshot's trackers")
+    rollback.add_argument("snapshot", help="Snapshot to restore, e.g. the fetch before a bad push")
+    rollback.add_argument("--current", help="Snapshot of the state to undo (default: the newest)")
+    rollback.add_argument("--out", required=True, help="Plan sheet to push (.xlsx, .csv or .csv.gz)")
+    rollback.set_defaults(func=cmd_rollback)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    result, exit_code = args.func(args)
+    json.dump(result, sys.stdout, indent=2)
+    print()
+    return exit_code
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import google_auth_httplib2
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from .metrics import default_metrics, describe_request
+from .retry import is_quota_response
+
+API_NAME = 'displayvideo'
+API_VERSION = 'v3'
+HTTP_TIMEOUT_SECONDS = 60
+# Points the tools at another server with the same API, e.g. the local stand-in in bench/.
+API_ENDPOINT_ENV = 'DV360_API_ENDPOINT'
+
+_discovery_doc = None
+_lock = threading.Lock()
+
+
+def discovery_document():
+    """Returns the DV360 discovery document bundled with googleapiclient, parsed once per process."""
+    global _discovery_doc
+    with _lock:
+        if _discovery_doc is None:
+            content = get_static_doc(API_NAME, API_VERSION)
+            if content is None:
+                raise RuntimeError(f"googleapiclient does not bundle a {API_NAME} {API_VERSION} discovery document")
+            _discovery_doc = json.loads(content)
+        return _discovery_doc
+
+
+def api_root_url():
+    """Returns the `API_ENDPOINT_ENV` root URL override, or None for the real API."""
+    endpoint = os.environ.get(API_ENDPOINT_ENV)
+    return endpoint.rstrip('/') + '/' if endpoint else None
+
+
+class InstrumentedHttp(httplib2.Http):
+    """An `httplib2.Http` that records every DV360 request in the process-wide metrics.
+
+    Each attempt is timed separately, so retried calls show up once per
+    attempt with the status they got. Other requests (e.g. token refreshes)
+    pass through unrecorded.
+    """
+
+    def request(self, uri, method="GET", *args, **kwargs):
+        described = describe_request(method, uri)
+        if described is None:
+            return super().request(uri, method, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            response, content = super().request(uri, method, *args, **kwargs)
+        except Exception:
+            default_metrics().record_call(*described, None, time.perf_counter() - started)
+            raise
+        status = int(response.status)
+        default_metrics().record_call(*described, status, time.perf_counter() - started,
+                                      quota=is_quota_response(status, content))
+        return response, content
+
+
+def build_service(creds):
+    """Builds a DV360 service with its own keep-alive HTTP connection."""
+    http = google_auth_httplib2.AuthorizedHttp(creds, http=InstrumentedHttp(timeout=HTTP_TIMEOUT_SECONDS))
+    document = discovery_document()
+    root_url = api_root_url()
+    if root_url:
+        # Batch requests go to rootUrl, which client_options cannot override.
+        document = dict(document, rootUrl=root_url, baseUrl=root_url + document.get('servicePath', ''))
+    return build_from_document(document, http=http)
+
+
+class ServicePool:
+    """A pool of DV360 service objects that threads lease one at a time.
+
+    googleapiclient services and their httplib2 connections are not
+    thread-safe, so each lease hands out a service no other thread is using.
+    Returned services keep their open connections for the next lease.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self):
+        with self._lock:
+            service = self._idle.pop() if self._idle else None
+        if service is None:
+            service = self._factory()
+        try:
+            yield service
+        finally:
+            with self._lock:
+                self._idle.append(service)
+
+
+def service_pool(creds):
+    """Returns the service pool for a set of credentials, shared by every caller using them.
+
+    The pool is kept on the credentials object, so it lives exactly as long as
+    they do: credentials replaced by a reload take their pool with them.
+    """
+    with _lock:
+        pool = getattr(creds, '_dv360_service_pool', None)
+        if pool is None:
+            pool = creds._dv360_service_pool = ServicePool(lambda: build_service(creds))
+        return pool
@@ -0,0 +1,163 @@
+"""Advertiser-wide discovery of creatives by tracker domain, URL pattern or creative type.
+
+Creatives are streamed page by page through `creatives().list` and matched
+as each page arrives; only the matching trackers are kept, so memory stays
+flat however many creatives an advertiser has.
+"""
+import re
+import threading
+from dataclasses import dataclass
+
+from .fetch import CREATIVE_FIELDS, DEFAULT_MAX_WORKERS, LIST_PAGE_SIZE, list_creatives
+from .ratelimit import TokenBucket
+from .records import CreativeRecord
+from .retry import DEFAULT_MAX_RETRIES
+from .trackers import TRACKER_MAP_HOSTED_VIDEO, reverse_map, url_domain
+from .workers import JobCancelled, run_in_pool
+
+DISCOVERY_FIELDS = CREATIVE_FIELDS + ",entityStatus"
+
+CREATIVE_TYPES = [
+    "CREATIVE_TYPE_STANDARD", "CREATIVE_TYPE_EXPANDABLE", "CREATIVE_TYPE_VIDEO", "CREATIVE_TYPE_NATIVE",
+    "CREATIVE_TYPE_TEMPLATED_APP_INSTALL", "CREATIVE_TYPE_NATIVE_SITE_SQUARE", "CREATIVE_TYPE_AUDIO",
+    "CREATIVE_TYPE_LIGHTBOX", "CREATIVE_TYPE_NATIVE_VIDEO",
+]
+HOSTING_SOURCES = ["HOSTING_SOURCE_CM", "HOSTING_SOURCE_THIRD_PARTY", "HOSTING_SOURCE_HOSTED", "HOSTING_SOURCE_RICH_MEDIA"]
+ENTITY_STATUSES = ["ENTITY_STATUS_ACTIVE", "ENTITY_STATUS_ARCHIVED", "ENTITY_STATUS_PAUSED"]
+
+
+@dataclass
+class CreativeFilter:
+    """What discovery looks for; empty criteria match everything.
+
+    A creative matches when its `creativeType`, `hostingSource` and
+    `entityStatus` are in the given lists and, if `domains` or `url_pattern`
+    are set, at least one of its trackers is on one of the domains (or a
+    subdomain) or matches the regular expression.
+    """
+    domains: tuple = ()
+    url_pattern: str = ''
+    creative_types: tuple = ()
+    hosting_sources: tuple = ()
+    entity_statuses: tuple = ()
+
+    def __post_init__(self):
+        self.domains = tuple(d.strip().lower().lstrip('.') for d in self.domains if d.strip())
+        self._pattern = re.compile(self.url_pattern) if self.url_pattern else None
+
+    @property
+    def filters_trackers(self):
+        return bool(self.domains or self._pattern)
+
+    def api_filter(self):
+        """The part of the filter DV360 can apply server-side, so fewer pages are sent.
+
+        DV360 allows at most one `entityStatus` restriction, so several
+        statuses are left to `matches_creative`.
+        """
+        clauses = []
+        if self.creative_types:
+            clauses.append("(" + " OR ".join(f'creativeType="{value}"' for value in self.creative_types) + ")")
+        if len(self.entity_statuses) == 1:
+            clauses.append(f'entityStatus="{self.entity_statuses[0]}"')
+        return " AND ".join(clauses) or None
+
+    def matches_creative(self, creative):
+        return ((not self.creative_types or creative.get('creativeType') in self.creative_types)
+                and (not self.hosting_sources or creative.get('hostingSource') in self.hosting_sources)
+                and (not self.entity_statuses or creative.get('entityStatus') in self.entity_statuses))
+
+    def matches_tracker(self, url):
+        if not self.filters_trackers:
+            return True
+        if self.domains:
+            domain = url_domain(url)
+            if any(domain == d or domain.endswith('.' + d) for d in self.domains):
+                return True
+        return bool(self._pattern and self._pattern.search(url))
+
+    def matching_trackers(self, creative):
+        """The creative's trackers that match, or None when the creative itself does not."""
+        if not self.matches_creative(creative):
+            return None
+        trackers = creative.get('thirdPartyUrls') or []
+        matched = [tracker for tracker in trackers if self.matches_tracker(tracker.get('url') or '')]
+        if self.filters_trackers and not matched:
+            return None
+        return matched
+
+
+def discover_creatives(service_factory, advertiser_ids, creative_filter, max_workers=DEFAULT_MAX_WORKERS,
+                       limiter=None, max_retries=DEFAULT_MAX_RETRIES, on_progress=None,
+                       tracker_map=TRACKER_MAP_HOSTED_VIDEO):
+    """Streams every creative of the advertisers and keeps the matching trackers.
+
+    Advertisers are scanned in parallel, one list stream each. Returns
+    `(creatives, rows, errors, scanned)`: `CreativeRecord`s of the matching
+    creatives, one tracker sheet row per matching tracker (a blank row for a
+    matching creative without trackers when no tracker criteria are set),
+    `(advertiser_id, error)` pairs for advertisers whose listing failed, and
+    the number of creatives scanned. `on_progress(done, total)` counts
+    finished advertisers and is also called after every page (under a lock,
+    on the scanning thread), so a `JobCancelled` it raises stops the scan
+    between pages.
+    """
+    limiter = limiter or TokenBucket()
+    labels = reverse_map(tracker_map)
+    filter_str = creative_filter.api_filter()
+    lock = threading.Lock()
+    state = {'done': 0, 'scanned': 0}
+    total = len(advertiser_ids)
+
+    def report(done=None, _=None):
+        with lock:
+            if done is not None:
+                state['done'] = done
+            if on_progress:
+                on_progress(state['done'], total)
+
+    def scan(service, advertiser_id):
+        creatives, rows = [], []
+        scanned = 0
+        for creative in list_creatives(service, advertiser_id, filter_str, DISCOVERY_FIELDS,
+                                       limiter=limiter, max_retries=max_retries):
+            scanned += 1
+            matched = creative_filter.matching_trackers(creative)
+            if matched is not None:
+                record = CreativeRecord.from_api(creative)
+                creatives.append(record)
+                creative_id = record.creative_id
+                name = record.display_name
+                for tracker in matched or [{}]:
+                    api_type = tracker.get('type', '')
+                    rows.append({
+                        "advertiser_id": str(advertiser_id),
+                        "creative_id": creative_id,
+                        "creative_name": name,
+                        "event_type": labels.get(api_type, api_type),
+                        "existing_url": tracker.get('url', ''),
+                        "new_url": ""
+                    })
+            if scanned % LIST_PAGE_SIZE == 0:
+                report()
+        with lock:
+            state['scanned'] += scanned
+        return creatives, rows
+
+    def work(service, advertiser_id):
+        try:
+            return scan(service, advertiser_id), None
+        except JobCancelled:
+            raise
+        except Exception as e:
+            return ([], []), e
+
+    results = run_in_pool(list(advertiser_ids), work, service_factory, max_workers, report)
+
+    creatives, rows, errors = [], [], []
+    for advertiser_id, ((found, found_rows), error) in zip(advertiser_ids, results):
+        creatives.extend(found)
+        rows.extend(found_rows)
+        if error is not None:
+            errors.append((advertiser_id, error))
+    return creatives, rows, errors, state['scanned']
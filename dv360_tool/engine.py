@@ -0,0 +1,408 @@
+"""Phase 1 fetch, Phase 2 validation and Phase 3 push, independent of any UI.
+
+The Streamlit pages and the command-line interface are thin layers over
+these functions.
+"""
+import csv
+import io
+import re
+from dataclasses import dataclass
+
+import pandas as pd
+
+from .batch import DEFAULT_BATCH_SIZE
+from .cache import default_cache, fetch_with_cache
+from .client import service_pool
+from .discover import discover_creatives
+from .fetch import DEFAULT_MAX_WORKERS, fetch_creatives, fetch_creatives_batched, lookup_creatives
+from .journal import FAILED, PENDING, SUCCESS, UNCHANGED, default_journal, new_run_id, plan_job_id
+from .plan import (
+    STATUS_EARLIER, STATUS_FAILED, STATUS_PENDING, STATUS_SUCCESS, STATUS_UNCHANGED,
+    build_plans, build_report, fetched_tracker_state, is_unchanged, keep_unlisted_trackers, summarize_changes
+)
+from .push import patch_creatives_batched, push_creatives
+from .ratelimit import DEFAULT_REQUESTS_PER_SECOND, default_limiter
+from .records import CreativeRecord, compact_creatives
+from .retry import DEFAULT_MAX_RETRIES
+from .rules import apply_rules, preview_diff
+from .snapshots import KIND_DISCOVER, KIND_FETCH, KIND_PUSH, default_snapshots, diff_snapshots, rollback_plan
+from .trackers import (
+    TRACKER_COLUMNS, TRACKER_MAP_HOSTED_VIDEO, UNLISTED_COLUMN, UNLISTED_KEEP,
+    creatives_to_rows, lists_some_trackers
+)
+from .workers import JobCancelled, fan_out
+
+LOOKUP_GET = "get"
+LOOKUP_LIST = "list"
+
+_ID_HEADERS = {'advertiser_id', 'creative_id'}
+
+JOURNAL_STATUSES = {
+    SUCCESS: STATUS_SUCCESS,
+    FAILED: STATUS_FAILED,
+    UNCHANGED: STATUS_UNCHANGED,
+    PENDING: STATUS_PENDING,
+}
+
+
+@dataclass
+class RunSettings:
+    """Concurrency and request options shared by fetch and push runs."""
+    max_workers: int = DEFAULT_MAX_WORKERS
+    requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND
+    max_retries: int = DEFAULT_MAX_RETRIES
+    use_batches: bool = False
+    batch_size: int = DEFAULT_BATCH_SIZE
+    lookup_mode: str = LOOKUP_GET
+    # Only decides whether fetches read the cache; fetched and patched creatives are always written to it.
+    use_cache: bool = True
+
+    def limiter(self):
+        """The process-wide limiter, set to this run's rate; jobs running at once share its budget."""
+        limiter = default_limiter()
+        limiter.configure(self.requests_per_second, burst=self.requests_per_second)
+        return limiter
+
+    def fair_share(self, advertiser_count):
+        """Splits `max_workers` between advertisers: returns `(advertisers at once, workers each)`."""
+        parallel = max(1, min(advertiser_count, self.max_workers))
+        return parallel, max(1, self.max_workers // parallel)
+
+
+def parse_id_pairs(text, advertiser_id=None):
+    """Reads `(advertiser_id, creative_id)` pairs from an uploaded CSV.
+
+    Accepts a two-column `advertiser_id,creative_id` file (with or without a
+    header) or a one-column file of creative IDs, in which case every row uses
+    `advertiser_id`; rows with an empty advertiser cell use it too, and so do
+    rows of a two-column file that hold a single cell. Blank rows and
+    repeated header lines are skipped, and trailing empty cells don't count
+    as a column. Raises `ValueError` for a row without an advertiser ID.
+    """
+    rows = [[cell.strip() for cell in row] for row in csv.reader(io.StringIO(text))]
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        return []
+    advertiser_col, creative_col = 0, 1
+    header = [cell.lower() for cell in rows[0]]
+    if 'creative_id' in header:
+        creative_col = header.index('creative_id')
+        advertiser_col = header.index('advertiser_id') if 'advertiser_id' in header else None
+        rows = rows[1:]
+    elif not all(cell.isdigit() for cell in rows[0] if cell):
+        rows = rows[1:]  # Some other header; columns are positional.
+    # Header lines can also repeat further down, e.g. in concatenated files.
+    rows = [row for row in rows if not _ID_HEADERS.intersection(cell.lower() for cell in row)]
+    width = max((max(i + 1 for i, cell in enumerate(row) if cell) for row in rows), default=0)
+    if 'creative_id' not in header and width < 2:
+        advertiser_col, creative_col = None, 0
+
+    pairs = []
+    for line, row in enumerate(rows, start=1):
+        if len(row) == 1:
+            creative_id, advertiser = row[0], ''
+        else:
+            creative_id = row[creative_col] if creative_col < len(row) else ''
+            has_advertiser = advertiser_col is not None and advertiser_col < len(row)
+            advertiser = row[advertiser_col] if has_advertiser else ''
+        if not creative_id:
+            continue
+        advertiser = advertiser or (str(advertiser_id).strip() if advertiser_id else '')
+        if not advertiser:
+            raise ValueError(f"Creative ID {creative_id} (row {line}) has no advertiser ID.")
+        pairs.append((advertiser, creative_id))
+    return pairs
+
+
+def group_by_advertiser(pairs):
+    """Groups `(advertiser_id, creative_id)` pairs into advertiser -> unique creative IDs, keeping input order."""
+    groups = {}
+    for advertiser_id, creative_id in pairs:
+        groups.setdefault(advertiser_id, {})[creative_id] = None
+    return {advertiser_id: list(ids) for advertiser_id, ids in groups.items()}
+
+
+def fetch_many(creds, advertiser_id, creative_ids, settings, on_progress=None, limiter=None, max_workers=None):
+    """Fetches creatives with the lookup mode, batching and cache from `settings`.
+
+    `limiter` and `max_workers` override the settings when one advertiser's
+    fetch is part of a larger run. Returns `(details, error)` pairs in the
+    same order as `creative_ids`.
+    """
+    kwargs = dict(
+        max_workers=max_workers or settings.max_workers,
+        limiter=limiter or settings.limiter(),
+        max_retries=settings.max_retries,
+        on_progress=on_progress
+    )
+    if settings.lookup_mode == LOOKUP_LIST:
+        fetch_fn = lookup_creatives
+    elif settings.use_batches:
+        fetch_fn = fetch_creatives_batched
+        kwargs['batch_size'] = settings.batch_size
+    else:
+        fetch_fn = fetch_creatives
+    services = service_pool(creds)
+    if settings.use_cache:
+        return fetch_with_cache(default_cache(), fetch_fn, services, advertiser_id, creative_ids, **kwargs)
+    fetched = fetch_fn(services, advertiser_id, creative_ids, **kwargs)
+    default_cache().put_many(details for details, _ in fetched)
+    return fetched
+
+
+def fetch_pairs(creds, pairs, settings, on_progress=None):
+    """Fetches `(advertiser_id, creative_id)` pairs, fanning out per advertiser.
+
+    Advertisers are fetched in parallel with a fair share of the workers
+    each, all drawing on one rate limiter. Each advertiser's creatives are
+    compacted to `CreativeRecord`s as soon as its fetch finishes. Returns
+    `(record, error)` pairs in the same order as `pairs`.
+    """
+    groups = group_by_advertiser(pairs)
+    parallel, workers = settings.fair_share(len(groups))
+    limiter = settings.limiter()
+
+    def run_group(advertiser_id, creative_ids, progress):
+        fetched = fetch_many(creds, advertiser_id, creative_ids, settings, progress, limiter=limiter, max_workers=workers)
+        return [(CreativeRecord.from_api(details) if details else None, error) for details, error in fetched]
+
+    results = fan_out(groups, run_group, parallel, on_progress)
+    fetched = {}
+    for advertiser_id, creative_ids in groups.items():
+        fetched.update(((advertiser_id, creative_id), result)
+                       for creative_id, result in zip(creative_ids, results[advertiser_id]))
+    return [fetched[pair] for pair in pairs]
+
+
+def run_fetch(creds, pairs, settings, on_progress=None):
+    """Phase 1: fetches creatives and flattens them into the editable sheet.
+
+    `pairs` are `(advertiser_id, creative_id)` tuples, possibly spanning many
+    advertisers. Returns `(creatives, processed_df, errors)`: a
+    `CreativeRecord` per pair (None where the fetch failed), the tracker rows,
+    and `(advertiser_id, creative_id, error)` triples. The fetched trackers
+    are saved as a snapshot.
+    """
+    fetched = fetch_pairs(creds, pairs, settings, on_progress)
+    creatives = [details for details, _ in fetched]
+    errors = [(advertiser_id, creative_id, error)
+              for (advertiser_id, creative_id), (_, error) in zip(pairs, fetched) if error is not None]
+    default_snapshots().save(creatives, KIND_FETCH)
+    return creatives, creatives_to_rows(pairs, creatives), errors
+
+
+def parse_advertiser_ids(text):
+    """Splits advertiser IDs separated by commas, spaces or new lines, dropping duplicates."""
+    return list(dict.fromkeys(re.split(r'[\s,;]+', text.strip()))) if text.strip() else []
+
+
+def run_discover(creds, advertiser_ids, creative_filter, settings, on_progress=None):
+    """Phase 1 without an ID list: streams whole advertisers and keeps what `creative_filter` matches.
+
+    Returns `(creatives, processed_df, errors, scanned)`: `CreativeRecord`s of
+    the matching creatives, a tracker sheet with only the matching trackers,
+    `(advertiser_id, error)` pairs for advertisers that could not be listed,
+    and the number of creatives scanned. The sheet is marked in its
+    `UNLISTED_COLUMN`, so a push keeps the trackers it leaves out. The
+    matching creatives' full tracker lists are saved as a snapshot.
+    """
+    creatives, rows, errors, scanned = discover_creatives(
+        service_pool(creds), advertiser_ids, creative_filter,
+        max_workers=settings.max_workers,
+        limiter=settings.limiter(),
+        max_retries=settings.max_retries,
+        on_progress=on_progress
+    )
+    default_cache().put_many(creative.to_api() for creative in creatives)
+    default_snapshots().save(creatives, KIND_DISCOVER)
+    processed_df = pd.DataFrame(rows, columns=TRACKER_COLUMNS).assign(**{UNLISTED_COLUMN: UNLISTED_KEEP})
+    return creatives, processed_df, errors, scanned
+
+
+def run_validate(plan_df):
+    """Phase 2: counts the additions, deletions, updates and unchanged rows."""
+    return summarize_changes(plan_df)
+
+
+def run_rewrite(sheet_df, rules):
+    """Phase 2 without a spreadsheet: applies rewrite rules to a Phase 1 sheet.
+
+    Returns `(plan_df, diff_df, counts)`: the plan for `run_push`, its
+    preview diff and the `run_validate` counts.
+    """
+    plan_df = apply_rules(sheet_df, rules)
+    if lists_some_trackers(sheet_df):
+        plan_df[UNLISTED_COLUMN] = UNLISTED_KEEP
+    return plan_df, preview_diff(plan_df), summarize_changes(plan_df)
+
+
+def run_snapshot_diff(before_id, after_id):
+    """Lists the trackers added and removed between two stored snapshots."""
+    store = default_snapshots()
+    return diff_snapshots(store.load(before_id), store.load(after_id))
+
+
+def run_rollback(target_id, current_id=None):
+    """Builds a Phase 3 plan restoring the trackers of snapshot `target_id`.
+
+    `current_id` is the snapshot of the state to undo, by default the newest
+    one. Returns `(plan_df, diff_df, counts)` like `run_rewrite`.
+    """
+    store = default_snapshots()
+    if current_id is None:
+        snapshots = store.snapshots()
+        if not snapshots:
+            raise KeyError("There are no snapshots to roll back from")
+        current_id = snapshots[0]['snapshot_id']
+    plan_df = rollback_plan(store.load(target_id), store.load(current_id))
+    return plan_df, preview_diff(plan_df), summarize_changes(plan_df)
+
+
+def plan_job(plan_df):
+    """Returns the journal job ID derived from this plan, which a push resumes while it is unfinished."""
+    return plan_job_id(build_plans(plan_df, TRACKER_MAP_HOSTED_VIDEO))
+
+
+def fresh_job_id(plan_df):
+    """Returns a new job ID for pushing a plan from scratch, ignoring earlier attempts."""
+    return new_run_id(plan_job(plan_df))
+
+
+def run_push(creds, plan_df, settings, fetched_creatives=None, on_progress=None, journal=None, job_id=None,
+             keep_unlisted=None):
+    """Phase 3: sends every creative whose tracker list changed.
+
+    Creatives are grouped per advertiser and the groups are pushed in
+    parallel with a fair share of the workers each (see `fetch_pairs`).
+
+    `fetched_creatives` are the Phase 1 `CreativeRecord`s, used to skip
+    no-op patches.
+
+    Every outcome is recorded in the journal (the default one unless given)
+    as it arrives. Without a `job_id`, a plan whose latest run still has
+    pending or failed creatives resumes that run and does not send again what
+    it already sent or found unchanged; those report rows are marked as done
+    in an earlier run. A plan whose earlier runs all finished starts a new
+    one. A `JobCancelled` raised by `on_progress` stops the push early and
+    leaves the unsent creatives pending.
+
+    With `keep_unlisted` (by default, when the sheet is marked as listing only
+    some trackers, like discovery sheets), the sheet's edits are merged into
+    the current trackers from `fetched_creatives` (fetched here when not
+    given), keeping the ones it leaves out; creatives without a current state
+    are failed rather than sent.
+
+    The patched creatives are saved as a snapshot, whose ID is the summary's
+    `snapshot_id`. Returns `(report_df, summary, responses)`; `responses`
+    holds the patched creatives returned by the API.
+    """
+    journal = journal or default_journal()
+    fetched_state = fetched_tracker_state(fetched_creatives)
+    plans = build_plans(plan_df, TRACKER_MAP_HOSTED_VIDEO)
+    if job_id is None:
+        plan_id = plan_job_id(plans)
+        job_id = journal.resumable_run(plan_id) or (new_run_id(plan_id) if journal.has_job(plan_id) else plan_id)
+    missing = []
+    if keep_unlisted is None:
+        keep_unlisted = lists_some_trackers(plan_df)
+    if keep_unlisted:
+        if fetched_creatives is None:
+            fetched_creatives = fetch_current_state(creds, plan_df, settings)
+            fetched_state = fetched_tracker_state(fetched_creatives)
+        plans, missing = keep_unlisted_trackers(plans, plan_df, fetched_creatives, TRACKER_MAP_HOSTED_VIDEO)
+    job_id = journal.start_job(plans + missing, job_id)
+    done = journal.done_keys(job_id)
+    journal.record_many(job_id, [
+        (plan.advertiser_id, plan.creative_id, FAILED,
+         "The creative's current trackers could not be fetched, so it was not sent.")
+        for plan in missing
+        if (str(plan.advertiser_id), str(plan.creative_id)) not in done
+    ])
+
+    patches = []
+    unchanged = []
+    for plan in plans:
+        if (str(plan.advertiser_id), str(plan.creative_id)) in done:
+            continue
+        if is_unchanged(fetched_state, *plan):
+            unchanged.append((plan.advertiser_id, plan.creative_id, UNCHANGED, ""))
+        else:
+            patches.append(plan)
+    journal.record_many(job_id, unchanged)
+
+    responses = []
+    # Patches that got an answer; a cancelled push leaves the others unsent.
+    sent = []
+    groups = {}
+    for plan in patches:
+        groups.setdefault(str(plan.advertiser_id), []).append(plan)
+    parallel, workers = settings.fair_share(len(groups))
+    limiter = settings.limiter()
+    services = service_pool(creds)
+
+    def run_group(advertiser_id, group, progress):
+        def record(i, response, error):
+            plan = group[i]
+            sent.append(plan.creative_id)
+            if error is None:
+                responses.append(response)
+            journal.record(job_id, plan.advertiser_id, plan.creative_id,
+                           SUCCESS if error is None else FAILED, "" if error is None else str(error))
+
+        kwargs = dict(
+            max_workers=workers,
+            limiter=limiter,
+            max_retries=settings.max_retries,
+            on_progress=progress,
+            on_result=record
+        )
+        if settings.use_batches:
+            patch_creatives_batched(services, group, batch_size=settings.batch_size, **kwargs)
+        else:
+            push_creatives(services, group, **kwargs)
+
+    cancelled = False
+    try:
+        fan_out(groups, run_group, parallel, on_progress)
+    except JobCancelled:
+        # Whatever finished is already in the journal; the rest stays pending for a resume.
+        cancelled = True
+    # Whatever `use_cache` says, the cache must not keep serving the pre-push trackers.
+    default_cache().put_many(responses)
+    snapshot_id = default_snapshots().save(compact_creatives(responses), KIND_PUSH, job_id)
+
+    recorded = journal.outcomes(job_id)
+    outcomes = {}
+    for plan in plans + missing:
+        key = (str(plan.advertiser_id), str(plan.creative_id))
+        status, error = recorded.get(key, (PENDING, ""))
+        if key in done:
+            error = f"{JOURNAL_STATUSES[status]} in an earlier run of job {job_id}."
+            outcomes[plan.creative_id] = (STATUS_EARLIER, error)
+        else:
+            outcomes[plan.creative_id] = (JOURNAL_STATUSES[status], error)
+
+    statuses = [status for status, _ in outcomes.values()]
+    summary = {
+        'job_id': job_id,
+        'creatives': len(plans) + len(missing),
+        'sent': len(sent),
+        'succeeded': statuses.count(STATUS_SUCCESS),
+        'failed': statuses.count(STATUS_FAILED),
+        'unchanged': statuses.count(STATUS_UNCHANGED),
+        'pending': statuses.count(STATUS_PENDING),
+        'earlier': statuses.count(STATUS_EARLIER),
+        'cancelled': cancelled,
+        'snapshot_id': snapshot_id,
+    }
+    return build_report(plan_df, outcomes), summary, responses
+
+
+def fetch_current_state(creds, plan_df, settings, on_progress=None):
+    """Fetches the current state of every creative in a plan, for no-op detection.
+
+    Creatives that fail to fetch are simply absent, so they will be sent.
+    """
+    pairs = zip(plan_df['advertiser_id'].astype(str).tolist(), plan_df['creative_id'].astype(str).tolist())
+    pairs = list(dict.fromkeys(pair for pair in pairs if all(pair)))
+    return [details for details, _ in fetch_pairs(creds, pairs, settings, on_progress) if details]
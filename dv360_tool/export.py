@@ -0,0 +1,96 @@
+import gzip
+from io import BytesIO
+
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from .plan import STATUS_FAILED
+
+EXCEL_MAX_ROWS = 1048575  # one row is the header
+ROWS_PER_CHUNK = 10000
+
+EXPORT_FORMATS = {
+    "Excel (.xlsx)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV (.csv)": ("csv", "text/csv"),
+    "Gzipped CSV (.csv.gz)": ("csv.gz", "application/gzip"),
+}
+
+LIGHT_GREY_FILL = PatternFill(start_color='E7E6E6', end_color='E7E6E6', fill_type='solid')
+FAILED_FILL = PatternFill(start_color='FFD6D6', end_color='FFD6D6', fill_type='solid')  # Red
+
+
+def _iter_rows(df):
+    """Yields plain Python rows chunk by chunk, with missing values as None."""
+    for start in range(0, len(df), ROWS_PER_CHUNK):
+        chunk = df.iloc[start:start + ROWS_PER_CHUNK].astype(object)
+        yield from chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def _banded_ranges(df, last_column):
+    """Sheet ranges covering the rows of every other creative, starting with the first one."""
+    creative_ids = df['creative_id'].astype(str)
+    starts = np.flatnonzero((creative_ids != creative_ids.shift()).to_numpy())
+    ends = np.append(starts[1:], len(df)) - 1
+    # Data starts on sheet row 2, below the header.
+    return ' '.join(f"A{start + 2}:{last_column}{end + 2}" for start, end in zip(starts[::2], ends[::2]))
+
+
+def generate_excel_file(df, is_report=False):
+    """Generates a color-coded Excel file with a streaming, write-only workbook.
+
+    Colours come from a single conditional-formatting rule rather than cell
+    styles: reports colour failed rows, edit sheets band every other creative
+    in grey.
+    """
+    if len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(df)} rows do not fit in an Excel sheet; export as CSV instead.")
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Trackers')
+
+    header = []
+    for name in df.columns:
+        cell = WriteOnlyCell(worksheet, value=str(name))
+        cell.font = Font(bold=True)
+        header.append(cell)
+    worksheet.append(header)
+
+    last_column = get_column_letter(max(len(df.columns), 1))
+    if is_report:
+        if 'upload_status' in df.columns and len(df):
+            status_column = get_column_letter(df.columns.get_loc('upload_status') + 1)
+            worksheet.conditional_formatting.add(
+                f"A2:{last_column}{len(df) + 1}",
+                FormulaRule(formula=[f'${status_column}2="{STATUS_FAILED}"'], fill=FAILED_FILL)
+            )
+    elif len(df):
+        worksheet.conditional_formatting.add(_banded_ranges(df, last_column),
+                                             FormulaRule(formula=['TRUE'], fill=LIGHT_GREY_FILL))
+    for row in _iter_rows(df):
+        worksheet.append(row)
+
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def generate_csv_file(df, compress=False):
+    """Generates a CSV (optionally gzip-compressed) export of the tracker sheet."""
+    output = BytesIO()
+    if compress:
+        with gzip.GzipFile(fileobj=output, mode='wb') as gz:
+            df.to_csv(gz, index=False, encoding='utf-8')
+    else:
+        df.to_csv(output, index=False, encoding='utf-8')
+    return output.getvalue()
+
+
+def export_file(df, extension, is_report=False):
+    """Exports a tracker sheet in one of the `EXPORT_FORMATS` extensions."""
+    if extension == "xlsx":
+        return generate_excel_file(df, is_report=is_report)
+    return generate_csv_file(df, compress=extension == "csv.gz")
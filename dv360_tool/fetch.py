@@ -0,0 +1,142 @@
+from .batch import DEFAULT_BATCH_SIZE, run_batched
+from .metrics import OP_GET, OP_LIST, default_metrics
+from .ratelimit import TokenBucket
+from .retry import DEFAULT_MAX_RETRIES, call_with_retry
+from .workers import run_in_pool
+
+DEFAULT_MAX_WORKERS = 8
+
+# Only the fields the pages read are requested in list lookups.
+CREATIVE_FIELDS = "advertiserId,creativeId,displayName,creativeType,hostingSource,thirdPartyUrls,updateTime"
+# DV360 rejects list filters longer than 500 characters.
+MAX_FILTER_LENGTH = 500
+LIST_PAGE_SIZE = 200
+
+
+class CreativeNotFoundError(LookupError):
+    """Raised (as a per-item error) when a list lookup does not return a creative."""
+
+    def __init__(self, advertiser_id, creative_id):
+        super().__init__(f"Creative ID {creative_id} was not found for Advertiser ID {advertiser_id}")
+        self.advertiser_id = advertiser_id
+        self.creative_id = creative_id
+
+
+def fetch_creative_details(service, advertiser_id, creative_id):
+    """Makes a live API call to fetch creative details."""
+    request = service.advertisers().creatives().get(
+        advertiserId=advertiser_id,
+        creativeId=creative_id
+    )
+    return request.execute()
+
+
+def fetch_creatives(service_factory, advertiser_id, creative_ids, max_workers=DEFAULT_MAX_WORKERS,
+                    limiter=None, max_retries=DEFAULT_MAX_RETRIES, on_progress=None):
+    """Fetches many creatives concurrently under a shared rate limit.
+
+    Transient and quota errors are retried with backoff. Returns a list of
+    `(details, error)` pairs in the same order as `creative_ids`; exactly one
+    of the two is None.
+    """
+    limiter = limiter or TokenBucket()
+
+    def work(service, creative_id):
+        details, error, _ = call_with_retry(
+            lambda: fetch_creative_details(service, advertiser_id, creative_id), limiter, max_retries,
+            on_retry=default_metrics().retry_counter(OP_GET, advertiser_id)
+        )
+        return details, error
+
+    return run_in_pool(creative_ids, work, service_factory, max_workers, on_progress)
+
+
+def fetch_creatives_batched(service_factory, advertiser_id, creative_ids, batch_size=DEFAULT_BATCH_SIZE,
+                            max_workers=DEFAULT_MAX_WORKERS, limiter=None, max_retries=DEFAULT_MAX_RETRIES,
+                            on_progress=None):
+    """Same as `fetch_creatives`, but groups the GET calls into batch requests."""
+    return run_batched(
+        service_factory, creative_ids,
+        lambda service, creative_id: service.advertisers().creatives().get(
+            advertiserId=advertiser_id, creativeId=creative_id
+        ),
+        batch_size, max_workers, limiter or TokenBucket(), max_retries, on_progress
+    )
+
+
+def creative_id_filters(creative_ids, max_length=MAX_FILTER_LENGTH):
+    """Splits IDs into `(chunk, filter)` pairs whose filter fits the length limit."""
+    chunks = []
+    chunk, clauses, length = [], [], 0
+    for creative_id in creative_ids:
+        clause = f'creativeId="{creative_id}"'
+        added = len(clause) + (len(" OR ") if clauses else 0)
+        if clauses and length + added > max_length:
+            chunks.append((chunk, " OR ".join(clauses)))
+            chunk, clauses, length = [], [], 0
+            added = len(clause)
+        chunk.append(creative_id)
+        clauses.append(clause)
+        length += added
+    if chunk:
+        chunks.append((chunk, " OR ".join(clauses)))
+    return chunks
+
+
+def list_creatives(service, advertiser_id, filter_str=None, fields=CREATIVE_FIELDS, limiter=None,
+                   max_retries=DEFAULT_MAX_RETRIES):
+    """Yields the creatives of an advertiser page by page, following `pageToken`.
+
+    Each page is retried on transient errors; a page that still fails raises.
+    """
+    page_token = None
+    while True:
+        kwargs = dict(
+            advertiserId=advertiser_id,
+            pageSize=LIST_PAGE_SIZE,
+            fields=f"creatives({fields}),nextPageToken"
+        )
+        if filter_str:
+            kwargs['filter'] = filter_str
+        if page_token:
+            kwargs['pageToken'] = page_token
+        request = service.advertisers().creatives().list(**kwargs)
+        response, error, _ = call_with_retry(request.execute, limiter, max_retries,
+                                             on_retry=default_metrics().retry_counter(OP_LIST, advertiser_id))
+        if error is not None:
+            raise error
+        yield from response.get('creatives', [])
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def lookup_creatives(service_factory, advertiser_id, creative_ids, max_workers=DEFAULT_MAX_WORKERS,
+                     limiter=None, max_retries=DEFAULT_MAX_RETRIES, on_progress=None):
+    """Same as `fetch_creatives`, but uses filtered `creatives().list` calls.
+
+    IDs are grouped into as few filters as the length limit allows, and only
+    `CREATIVE_FIELDS` are returned. IDs missing from the results are reported
+    with a `CreativeNotFoundError`.
+    """
+    limiter = limiter or TokenBucket()
+
+    def work(service, task):
+        chunk, filter_str = task
+        try:
+            found = {
+                str(creative.get('creativeId')): creative
+                for creative in list_creatives(service, advertiser_id, filter_str,
+                                               limiter=limiter, max_retries=max_retries)
+            }
+        except Exception as e:
+            return [(None, e)] * len(chunk)
+        return [
+            (found[str(creative_id)], None) if str(creative_id) in found
+            else (None, CreativeNotFoundError(advertiser_id, creative_id))
+            for creative_id in chunk
+        ]
+
+    tasks = creative_id_filters(creative_ids)
+    results = run_in_pool(tasks, work, service_factory, max_workers, on_progress, size=lambda task: len(task[0]))
+    return [pair for chunk_results in results for pair in chunk_results]
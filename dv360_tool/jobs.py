@@ -0,0 +1,131 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .workers import JobCancelled
+
+MAX_CONCURRENT_JOBS = 4
+# Finished jobs are forgotten after this long if nobody collected them.
+FINISHED_JOB_TTL_SECONDS = 60 * 60
+
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class Job:
+    """A fetch or push running on a background thread, with live progress."""
+
+    def __init__(self, kind):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = RUNNING
+        self.done = 0
+        self.total = 0
+        # Set when a worker picks the job up; jobs can queue behind MAX_CONCURRENT_JOBS others.
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+
+    def progress(self, done, total):
+        """Progress callback for the engine; raises `JobCancelled` once cancel is requested."""
+        self.done, self.total = done, total
+        if self._cancel.is_set() and done < total:
+            raise JobCancelled()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def finished(self):
+        return self.status != RUNNING
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def throughput(self):
+        """Creatives processed per second so far."""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Estimated seconds left, or None before the first item completes."""
+        if not self.throughput or not self.total:
+            return None
+        return max(0.0, (self.total - self.done) / self.throughput)
+
+
+class JobManager:
+    """Runs jobs on a small shared thread pool so Streamlit reruns never block on them."""
+
+    def __init__(self, max_jobs=MAX_CONCURRENT_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="dv360-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Starts `fn(*args, on_progress=job.progress, **kwargs)` and returns its `Job`."""
+        job = Job(kind)
+        with self._lock:
+            self._purge()
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.started_at = time.time()
+        status = FAILED
+        try:
+            job.result = fn(*args, on_progress=job.progress, **kwargs)
+            status = CANCELLED if job.cancel_requested else DONE
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            job.error = e
+        finally:
+            # Other threads go by `finished`, so `finished_at` has to be set before the status.
+            job.finished_at = time.time()
+            job.status = status
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def forget(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _purge(self):
+        cutoff = time.time() - FINISHED_JOB_TTL_SECONDS
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def default_manager():
+    """Returns the process-wide job manager shared by every session."""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = JobManager()
+        return _default_manager
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_JOURNAL_PATH = os.path.join('.dv360_state', 'journal.sqlite')
+
+PENDING = 'pending'
+SUCCESS = 'success'
+FAILED = 'failed'
+UNCHANGED = 'unchanged'
+# Creatives in these states are not sent again when a job resumes.
+DONE_STATES = (SUCCESS, UNCHANGED)
+
+
+def payload_hash(trackers):
+    """Returns a stable digest of a creative's planned `thirdPartyUrls`."""
+    return hashlib.sha256(json.dumps(trackers, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def plan_job_id(plans):
+    """Derives a job ID from the plan contents, so re-running an unfinished plan resumes its job."""
+    digest = hashlib.sha256()
+    for plan in sorted(plans, key=lambda p: (str(p.advertiser_id), str(p.creative_id))):
+        digest.update(f"{plan.advertiser_id}/{plan.creative_id}/{payload_hash(plan.trackers)}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def new_run_id(job_id):
+    """Returns a new job ID for another run of the plan behind `job_id`."""
+    return f"{job_id}-{uuid.uuid4().hex[:8]}"
+
+
+class PushJournal:
+    """Durable per-creative record of Phase 3 pushes, stored in SQLite.
+
+    Every outcome is committed as soon as it arrives, so a push that dies
+    halfway can be resumed and only re-sends pending or failed creatives.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " total INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " job_id TEXT NOT NULL,"
+            " advertiser_id TEXT NOT NULL,"
+            " creative_id TEXT NOT NULL,"
+            " payload_hash TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " error TEXT NOT NULL DEFAULT '',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (job_id, advertiser_id, creative_id))"
+        )
+
+    def start_job(self, plans, job_id=None):
+        """Registers (or reopens) a job for a list of `CreativePlan`s and returns its ID.
+
+        Items already recorded with the same payload keep their status; items
+        whose payload changed go back to pending.
+        """
+        job_id = job_id or plan_job_id(plans)
+        now = time.time()
+        rows = [
+            (job_id, str(plan.advertiser_id), str(plan.creative_id), payload_hash(plan.trackers), now)
+            for plan in plans
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, created_at, updated_at, total) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (job_id) DO UPDATE SET updated_at = excluded.updated_at, total = excluded.total",
+                (job_id, now, now, len(rows))
+            )
+            self._conn.executemany(
+                "INSERT INTO items (job_id, advertiser_id, creative_id, payload_hash, status, updated_at)"
+                f" VALUES (?, ?, ?, ?, '{PENDING}', ?)"
+                " ON CONFLICT (job_id, advertiser_id, creative_id) DO UPDATE SET"
+                f"  status = CASE WHEN payload_hash = excluded.payload_hash THEN status ELSE '{PENDING}' END,"
+                "  payload_hash = excluded.payload_hash",
+                rows
+            )
+            self._conn.execute("COMMIT")
+        return job_id
+
+    def record(self, job_id, advertiser_id, creative_id, status, error=''):
+        """Commits the outcome of one creative."""
+        self.record_many(job_id, [(advertiser_id, creative_id, status, error)])
+
+    def record_many(self, job_id, outcomes):
+        """Commits `(advertiser_id, creative_id, status, error)` outcomes in one transaction."""
+        now = time.time()
+        rows = [
+            (status, error or '', now, job_id, str(advertiser_id), str(creative_id))
+            for advertiser_id, creative_id, status, error in outcomes
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE items SET status = ?, error = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE job_id = ? AND advertiser_id = ? AND creative_id = ?",
+                rows
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+            self._conn.execute("COMMIT")
+
+    def has_job(self, job_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+    def resumable_run(self, job_id):
+        """Returns the newest run of `job_id` (the job itself or one from `new_run_id`) that still has
+        pending or failed creatives, or None when every run finished."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE (job_id = ? OR job_id LIKE ?) AND EXISTS ("
+                f" SELECT 1 FROM items WHERE items.job_id = jobs.job_id AND status NOT IN {DONE_STATES})"
+                " ORDER BY updated_at DESC LIMIT 1",
+                (job_id, f"{job_id}-%")
+            ).fetchone()
+        return row[0] if row else None
+
+    def done_keys(self, job_id):
+        """Returns the (advertiser_id, creative_id) keys that need no further push."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT advertiser_id, creative_id FROM items WHERE job_id = ? AND status IN {DONE_STATES}",
+                (job_id,)
+            ).fetchall()
+        return set(rows)
+
+    def outcomes(self, job_id):
+        """Returns `{(advertiser_id, creative_id): (status, error)}` for a job."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT advertiser_id, creative_id, status, error FROM items WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return {(a, c): (status, error) for a, c, status, error in rows}
+
+    def counts(self, job_id):
+        """Returns `{status: count}` for a job."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def jobs(self):
+        """Lists jobs, newest first, with their per-status counts."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, created_at, updated_at, total FROM jobs ORDER BY updated_at DESC"
+            ).fetchall()
+        return [
+            {'job_id': job_id, 'created_at': created_at, 'updated_at': updated_at, 'total': total,
+             'counts': self.counts(job_id)}
+            for job_id, created_at, updated_at, total in rows
+        ]
+
+
+_default_journal = None
+_default_journal_lock = threading.Lock()
+
+
+def default_journal():
+    """Returns the process-wide push journal."""
+    global _default_journal
+    with _default_journal_lock:
+        if _default_journal is None:
+            _default_journal = PushJournal()
+        return _default_journal
@@ -0,0 +1,241 @@
+"""Per-call instrumentation of DV360 API requests.
+
+Every HTTP exchange with the API is timed and counted by operation (`get`,
+`list`, `patch` or `batch`), advertiser and status; the calls inside a batch
+are counted too, without a latency of their own. Retries are counted where
+they are decided. Like the creative cache, the counters are process-wide and
+cumulative, the way Prometheus expects counters to behave.
+"""
+import json
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+OP_GET = 'get'
+OP_LIST = 'list'
+OP_PATCH = 'patch'
+OP_BATCH = 'batch'
+
+# Upper bounds in seconds, as in a Prometheus histogram.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Status label for calls that got no HTTP response at all (timeouts, resets).
+NO_RESPONSE = 'error'
+
+_CREATIVE_PATH = re.compile(r'/advertisers/([^/]+)/creatives(?:/([^/:]+))?/?$')
+_BATCH_PATH = re.compile(r'/batch(?:/|$)')
+
+_default_metrics = None
+_default_metrics_lock = threading.Lock()
+
+
+def describe_request(method, uri):
+    """Returns `(operation, advertiser_id)` for a DV360 request URI, or None for other URIs."""
+    path = urlsplit(uri).path
+    if _BATCH_PATH.search(path):
+        return OP_BATCH, ''
+    match = _CREATIVE_PATH.search(path)
+    if not match:
+        return None
+    if method == 'PATCH':
+        return OP_PATCH, match[1]
+    return (OP_GET if match[2] else OP_LIST), match[1]
+
+
+def histogram_quantile(fraction, counts):
+    """Estimates a quantile from per-bucket counts by interpolating inside the bucket, as Prometheus does."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if count and seen + count >= rank:
+            lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+            if i == len(LATENCY_BUCKETS):
+                # Past the last bound there is nothing to interpolate towards.
+                return LATENCY_BUCKETS[-1]
+            return lower + (LATENCY_BUCKETS[i] - lower) * (rank - seen) / count
+        seen += count
+    return LATENCY_BUCKETS[-1]
+
+
+class _Series:
+    """Counters for one (operation, advertiser) pair."""
+    __slots__ = ('statuses', 'retries', 'quota_errors', 'buckets', 'latency_sum')
+
+    def __init__(self):
+        self.statuses = {}
+        self.retries = 0
+        self.quota_errors = 0
+        # One count per bound in LATENCY_BUCKETS plus one for +Inf; not cumulative.
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+
+    @property
+    def calls(self):
+        return sum(self.statuses.values())
+
+
+class ApiMetrics:
+    """Thread-safe counters and latency histograms for DV360 API calls."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+            self.started_at = time.time()
+
+    def _get_series(self, operation, advertiser_id):
+        key = (operation, str(advertiser_id or ''))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series()
+        return series
+
+    def record_call(self, operation, advertiser_id, status, seconds=None, quota=False):
+        """Counts one call; `status` is None when no response came back, `seconds` None inside a batch."""
+        status = NO_RESPONSE if status is None else str(status)
+        with self._lock:
+            series = self._get_series(operation, advertiser_id)
+            series.statuses[status] = series.statuses.get(status, 0) + 1
+            if quota:
+                series.quota_errors += 1
+            if seconds is not None:
+                series.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+                series.latency_sum += seconds
+
+    def record_retry(self, operation, advertiser_id):
+        with self._lock:
+            self._get_series(operation, advertiser_id).retries += 1
+
+    def retry_counter(self, operation, advertiser_id):
+        """An `on_retry` callback for `call_with_retry` that counts against this series."""
+        return lambda error: self.record_retry(operation, advertiser_id)
+
+    def snapshot(self):
+        """The counters as plain data: one entry per (operation, advertiser)."""
+        with self._lock:
+            series = [
+                {
+                    'operation': operation,
+                    'advertiser_id': advertiser_id,
+                    'calls': s.calls,
+                    'statuses': dict(s.statuses),
+                    'retries': s.retries,
+                    'quota_errors': s.quota_errors,
+                    'latency': {
+                        'count': sum(s.buckets),
+                        'sum': s.latency_sum,
+                        'buckets': list(s.buckets),
+                    },
+                }
+                for (operation, advertiser_id), s in sorted(self._series.items())
+            ]
+            return {'started_at': self.started_at, 'bucket_bounds': list(LATENCY_BUCKETS), 'series': series}
+
+    def summary(self):
+        """One row per operation and advertiser, for display."""
+        rows = []
+        for s in self.snapshot()['series']:
+            counts = s['latency']['buckets']
+            p50, p95 = histogram_quantile(0.5, counts), histogram_quantile(0.95, counts)
+            errors = sum(count for status, count in s['statuses'].items()
+                         if status == NO_RESPONSE or int(status) >= 400)
+            rows.append({
+                'operation': s['operation'],
+                'advertiser_id': s['advertiser_id'],
+                'calls': s['calls'],
+                'errors': errors,
+                'quota_errors': s['quota_errors'],
+                'quota_rate': round(s['quota_errors'] / s['calls'], 4) if s['calls'] else 0.0,
+                'retries': s['retries'],
+                'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+                'statuses': ', '.join(f"{status}: {count}" for status, count in sorted(s['statuses'].items())),
+            })
+        return pd.DataFrame(rows, columns=['operation', 'advertiser_id', 'calls', 'errors', 'quota_errors',
+                                           'quota_rate', 'retries', 'p50_ms', 'p95_ms', 'statuses'])
+
+    def totals(self):
+        """Calls, quota errors and retries over every series, with overall latency quantiles.
+
+        `calls` counts API calls, so a batch counts once per call inside it
+        and not for its own HTTP request; latencies are per HTTP request.
+        """
+        snapshot = self.snapshot()['series']
+        counts = [sum(column) for column in zip(*(s['latency']['buckets'] for s in snapshot))]
+        p50, p95 = histogram_quantile(0.5, counts), histogram_quantile(0.95, counts)
+        return {
+            'calls': sum(s['calls'] for s in snapshot if s['operation'] != OP_BATCH),
+            'quota_errors': sum(s['quota_errors'] for s in snapshot),
+            'retries': sum(s['retries'] for s in snapshot),
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """The counters in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP dv360_api_requests_total DV360 API calls by operation, advertiser and HTTP status.",
+            "# TYPE dv360_api_requests_total counter",
+        ]
+        for s in snapshot['series']:
+            for status, count in sorted(s['statuses'].items()):
+                lines.append(f"dv360_api_requests_total{{{_labels(s, status=status)}}} {count}")
+        lines += [
+            "# HELP dv360_api_retries_total Calls sent again after a transient or quota error.",
+            "# TYPE dv360_api_retries_total counter",
+        ]
+        lines += [f"dv360_api_retries_total{{{_labels(s)}}} {s['retries']}"
+                  for s in snapshot['series'] if s['operation'] != OP_BATCH]
+        lines += [
+            "# HELP dv360_api_quota_errors_total Calls rejected for exhausted quota.",
+            "# TYPE dv360_api_quota_errors_total counter",
+        ]
+        lines += [f"dv360_api_quota_errors_total{{{_labels(s)}}} {s['quota_errors']}" for s in snapshot['series']]
+        lines += [
+            "# HELP dv360_api_request_duration_seconds Latency of DV360 HTTP requests.",
+            "# TYPE dv360_api_request_duration_seconds histogram",
+        ]
+        for s in snapshot['series']:
+            latency = s['latency']
+            if not latency['count']:
+                continue
+            cumulative = 0
+            for bound, count in zip([*LATENCY_BUCKETS, math.inf], latency['buckets']):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f"dv360_api_request_duration_seconds_bucket{{{_labels(s, le=le)}}} {cumulative}")
+            lines.append(f"dv360_api_request_duration_seconds_sum{{{_labels(s)}}} {latency['sum']:.6f}")
+            lines.append(f"dv360_api_request_duration_seconds_count{{{_labels(s)}}} {latency['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(series, **extra):
+    labels = {'operation': series['operation'], 'advertiser_id': series['advertiser_id'], **extra}
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def default_metrics():
+    """Returns the process-wide metrics every service and worker thread records into."""
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = ApiMetrics()
+        return _default_metrics
@@ -0,0 +1,29 @@
+"""The API metrics panel both Streamlit pages show under their main content."""
+import streamlit as st
+
+from .metrics import default_metrics
+
+
+@st.fragment
+def show_api_metrics():
+    """Per-call API metrics of this server process; refreshing only reruns this fragment."""
+    metrics = default_metrics()
+    refresh_col, reset_col, json_col, prometheus_col = st.columns(4)
+    refresh_col.button("Refresh metrics")
+    if reset_col.button("Reset metrics"):
+        metrics.reset()
+    summary = metrics.summary()
+    if summary.empty:
+        st.caption("No API calls recorded yet.")
+        return
+    totals = metrics.totals()
+    calls_col, p95_col, quota_col, retries_col = st.columns(4)
+    calls_col.metric("API calls", totals['calls'])
+    p95_col.metric("p95 request latency", f"{totals['p95_ms']} ms" if totals['p95_ms'] is not None else "n/a")
+    quota_col.metric("Quota errors", totals['quota_errors'])
+    retries_col.metric("Retries", totals['retries'])
+    st.dataframe(summary, hide_index=True)
+    json_col.download_button("Export JSON", metrics.to_json(), file_name="dv360_api_metrics.json",
+                             mime="application/json")
+    prometheus_col.download_button("Export Prometheus", metrics.to_prometheus(), file_name="dv360_api_metrics.prom",
+                                   mime="text/plain")
@@ -0,0 +1,169 @@
+from typing import NamedTuple
+
+STATUS_SUCCESS = "✅ Success"
+STATUS_FAILED = "❌ Failed"
+STATUS_UNCHANGED = "⏭ Unchanged"
+STATUS_PENDING = "⏳ Pending"
+# Sent or found unchanged by an earlier run of a resumed job, not by this one.
+STATUS_EARLIER = "↩ Done in an earlier run"
+
+
+class CreativePlan(NamedTuple):
+    """The final tracker list to send for one creative."""
+    advertiser_id: str
+    creative_id: str
+    trackers: list
+
+
+def summarize_changes(edited_df):
+    """Counts the rows of an edited tracker sheet per kind of change."""
+    new_url = edited_df['new_url'].astype(str)
+    existing_url = edited_df['existing_url'].astype(str)
+    is_delete = new_url.str.lower() == 'delete'
+    return {
+        'adds': int((existing_url == '').sum()),
+        'deletes': int(is_delete.sum()),
+        'updates': int(((new_url != '') & ~is_delete & (existing_url != '')).sum()),
+        'no_change': int(((new_url == '') & (existing_url != '')).sum()),
+    }
+
+
+def _planned_trackers(df, tracker_map):
+    """Returns the (type, url) columns of the trackers that survive the edits.
+
+    A row is dropped when `new_url` says 'delete' or when it has no event type
+    or no URL. Otherwise the new URL wins over the existing one, and the event
+    type is translated through the tracker map (unknown types pass through).
+    """
+    cols = df[['event_type', 'existing_url', 'new_url']].fillna('').astype(str)
+    new_url = cols['new_url'].str.strip()
+    url = new_url.where(new_url != '', cols['existing_url'].str.strip())
+    event_type = cols['event_type']
+    keep = (new_url.str.lower() != 'delete') & (event_type.str.strip() != '') & (url != '')
+    api_type = event_type.map(tracker_map).fillna(event_type)
+    return keep, api_type, url
+
+
+def final_trackers(df, tracker_map):
+    """Builds the `thirdPartyUrls` payload for a single creative's tracker rows."""
+    keep, api_type, url = _planned_trackers(df, tracker_map)
+    return [{"type": t, "url": u} for t, u in zip(api_type[keep].tolist(), url[keep].tolist())]
+
+
+def build_plans(plan_df, tracker_map):
+    """Builds one `CreativePlan` per creative of an edited tracker sheet.
+
+    All rows are classified in one vectorised pass; plans come back in
+    sorted creative ID order, like `plan_df.groupby('creative_id')`.
+    """
+    keep, api_type, url = _planned_trackers(plan_df, tracker_map)
+    creative_ids = plan_df['creative_id']
+
+    trackers_by_creative = {}
+    for creative_id, t, u in zip(creative_ids[keep].tolist(), api_type[keep].tolist(), url[keep].tolist()):
+        trackers_by_creative.setdefault(creative_id, []).append({"type": t, "url": u})
+
+    advertiser_ids = plan_df.groupby('creative_id')['advertiser_id'].first()
+    return [
+        CreativePlan(advertiser_id, creative_id, trackers_by_creative.get(creative_id, []))
+        for creative_id, advertiser_id in zip(advertiser_ids.index.tolist(), advertiser_ids.tolist())
+    ]
+
+
+def _merge_listed(current, rows):
+    """Applies a creative's sheet rows to its current `(type, url)` trackers, keeping their order.
+
+    A row whose `existing_url` is a current tracker replaces or deletes it
+    where it stands; other rows are appended, unless the creative already has
+    that tracker. A current tracker the sheet does not list is kept, except
+    when an edit turns a listed tracker into the same one.
+    """
+    merged = list(current)
+    positions = {}
+    for i, (api_type, url) in enumerate(current):
+        positions.setdefault((api_type, url.strip()), []).append(i)
+    listed, added = set(), []
+    for api_type, existing_url, new_url in rows:
+        is_delete = new_url.lower() == 'delete'
+        url = existing_url if is_delete or not new_url else new_url
+        if existing_url and positions.get((api_type, existing_url)):
+            i = positions[(api_type, existing_url)].pop(0)
+            listed.add(i)
+            merged[i] = None if is_delete or not url else (api_type, url)
+        elif api_type and url and not is_delete:
+            added.append((api_type, url))
+    targets = {merged[i] for i in listed if merged[i]}
+    merged = [tracker for i, tracker in enumerate(merged)
+              if tracker and (i in listed or (tracker[0], tracker[1].strip()) not in targets)]
+    present = {(api_type, url.strip()) for api_type, url in merged}
+    for tracker in added:
+        if tracker not in present:
+            present.add(tracker)
+            merged.append(tracker)
+    return merged
+
+
+def keep_unlisted_trackers(plans, plan_df, creatives, tracker_map):
+    """Merges sheets that list only some trackers (e.g. from discovery) into the current ones.
+
+    Each creative keeps its current trackers in their current order, with the
+    sheet's edits applied in place and its new trackers appended, so an
+    unedited sheet plans no change at all. `creatives` are `CreativeRecord`s.
+    Returns `(plans, missing)`; creatives without a record cannot be merged
+    and are left out of `plans` and returned in `missing`.
+    """
+    cols = plan_df[['creative_id', 'event_type', 'existing_url', 'new_url']].fillna('').astype(str)
+    api_type = cols['event_type'].str.strip().map(tracker_map).fillna(cols['event_type'].str.strip())
+    rows_by_creative = {}
+    for creative_id, row in zip(cols['creative_id'].tolist(),
+                                zip(api_type.tolist(), cols['existing_url'].str.strip().tolist(),
+                                    cols['new_url'].str.strip().tolist())):
+        rows_by_creative.setdefault(creative_id, []).append(row)
+
+    current = {creative.creative_id: creative.trackers for creative in creatives or [] if creative}
+    merged, missing = [], []
+    for plan in plans:
+        creative_id = str(plan.creative_id)
+        if creative_id not in current:
+            missing.append(plan)
+            continue
+        trackers = _merge_listed(current[creative_id], rows_by_creative.get(creative_id, []))
+        merged.append(plan._replace(trackers=[{'type': t, 'url': u} for t, u in trackers]))
+    return merged, missing
+
+
+def build_report(plan_df, outcomes):
+    """Adds `upload_status`/`details` columns to the plan rows.
+
+    `outcomes` maps creative ID to a `(status, details)` pair. Rows come back
+    grouped by creative in sorted creative ID order.
+    """
+    report = plan_df[plan_df['creative_id'].notna()].sort_values('creative_id', kind='stable')
+    report = report.copy()
+    report['upload_status'] = report['creative_id'].map({c: status for c, (status, _) in outcomes.items()})
+    report['details'] = report['creative_id'].map({c: details for c, (_, details) in outcomes.items()})
+    return report
+
+
+def tracker_key(trackers):
+    """Normalises a `thirdPartyUrls` list into a comparable tuple of (type, url)."""
+    return tuple((t.get('type') or '', (t.get('url') or '').strip()) for t in trackers or [])
+
+
+def fetched_tracker_state(creatives):
+    """Maps (advertiser_id, creative_id) to the tracker key of each fetched `CreativeRecord`."""
+    return {
+        creative.key: tuple((t, u.strip()) for t, u in creative.trackers)
+        for creative in creatives or []
+        if creative
+    }
+
+
+def is_unchanged(fetched_state, advertiser_id, creative_id, trackers):
+    """True when the planned tracker list is identical to the fetched one.
+
+    Creatives that were not fetched in this session are never considered
+    unchanged, so they are always sent.
+    """
+    key = (str(advertiser_id), str(creative_id))
+    return key in fetched_state and fetched_state[key] == tracker_key(trackers)
@@ -0,0 +1,50 @@
+from .batch import DEFAULT_BATCH_SIZE, run_batched
+from .fetch import DEFAULT_MAX_WORKERS
+from .metrics import OP_PATCH, default_metrics
+from .ratelimit import TokenBucket
+from .retry import DEFAULT_MAX_RETRIES, call_with_retry
+from .workers import run_in_pool
+
+
+def patch_creative_request(service, advertiser_id, creative_id, trackers):
+    """Builds the PATCH request that replaces a creative's third-party trackers."""
+    return service.advertisers().creatives().patch(
+        advertiserId=str(advertiser_id),
+        creativeId=str(creative_id),
+        updateMask="thirdPartyUrls",
+        body={"thirdPartyUrls": trackers}
+    )
+
+
+def patch_creative(service, advertiser_id, creative_id, trackers):
+    """Makes a live API call replacing a creative's third-party trackers."""
+    return patch_creative_request(service, advertiser_id, creative_id, trackers).execute()
+
+
+def push_creatives(service_factory, patches, max_workers=DEFAULT_MAX_WORKERS, limiter=None,
+                   max_retries=DEFAULT_MAX_RETRIES, on_progress=None, on_result=None):
+    """Sends `(advertiser_id, creative_id, trackers)` patches concurrently.
+
+    Every patch goes through the shared limiter and is retried with backoff
+    on transient and quota errors. `on_result(index, response, error)` is
+    called as each patch finishes. Returns `(response, error)` pairs in the
+    same order as `patches`.
+    """
+    limiter = limiter or TokenBucket()
+
+    def work(service, patch):
+        response, error, _ = call_with_retry(lambda: patch_creative(service, *patch), limiter, max_retries,
+                                             on_retry=default_metrics().retry_counter(OP_PATCH, patch[0]))
+        return response, error
+
+    return run_in_pool(patches, work, service_factory, max_workers, on_progress,
+                       on_result=(lambda i, result: on_result(i, *result)) if on_result else None)
+
+
+def patch_creatives_batched(service_factory, patches, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                            limiter=None, max_retries=DEFAULT_MAX_RETRIES, on_progress=None, on_result=None):
+    """Same as `push_creatives`, but groups the PATCH calls into batch requests."""
+    return run_batched(
+        service_factory, patches, lambda service, patch: patch_creative_request(service, *patch),
+        batch_size, max_workers, limiter or TokenBucket(), max_retries, on_progress, on_result
+    )
@@ -0,0 +1,82 @@
+import threading
+import time
+
+# Default DV360 API quota is 1,500 requests per minute per project.
+# We stay a little under it so other tools sharing the project still get through.
+DEFAULT_REQUESTS_PER_SECOND = 20
+DEFAULT_BURST = 20
+MIN_REQUESTS_PER_SECOND = 1
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter shared by all worker threads."""
+
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST, min_rate=MIN_REQUESTS_PER_SECOND):
+        self.rate = float(rate)
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.capacity = float(max(burst, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` tokens are available, then consumes them.
+
+        Requests larger than the bucket wait for a full bucket and leave it in
+        debt, so later callers pay for the overdraft.
+        """
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def configure(self, rate, burst=None):
+        """Changes the maximum rate (and the bucket size); a slow-down after quota errors carries over."""
+        with self._lock:
+            self._refill(time.monotonic())
+            slowed = self.rate < self.max_rate
+            self.max_rate = float(rate)
+            self.min_rate = min(float(MIN_REQUESTS_PER_SECOND), self.max_rate)
+            self.rate = min(self.rate, self.max_rate) if slowed else self.max_rate
+            if burst is not None:
+                self.capacity = float(max(burst, 1))
+                self._tokens = min(self._tokens, self.capacity)
+
+    def slow_down(self):
+        """Halves the rate after a quota error, down to `min_rate`."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self, step=0.5):
+        """Creeps the rate back towards its configured maximum after a success."""
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + step)
+
+
+def default_limiter():
+    """Returns the process-wide limiter, so concurrent jobs share one request budget."""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = TokenBucket()
+        return _default_limiter
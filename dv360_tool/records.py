@@ -0,0 +1,81 @@
+"""Slim in-memory form of fetched creatives.
+
+A creative resource from `get` carries assets, dimensions, review status and
+more, but the pages only read a handful of fields. Sessions keep
+`CreativeRecord`s instead and drop the raw payloads; the on-disk creative
+cache still holds what the API returned.
+"""
+import sys
+
+from .trackers import TRACKER_MAP_HOSTED_VIDEO, TRACKER_MAP_STANDARD, TRACKER_MAP_VAST_VIDEO
+
+# Every known tracker type maps to one shared string object.
+_TRACKER_TYPES = {
+    api_type: api_type
+    for tracker_map in (TRACKER_MAP_STANDARD, TRACKER_MAP_VAST_VIDEO, TRACKER_MAP_HOSTED_VIDEO)
+    for api_type in tracker_map.values()
+}
+
+
+def intern_tracker_type(api_type):
+    """Returns the shared string for a `thirdPartyUrls` type, interning unknown ones."""
+    if not api_type:
+        return ''
+    return _TRACKER_TYPES.get(api_type) or sys.intern(api_type)
+
+
+class CreativeRecord:
+    """The fields of a creative the tools use; `trackers` is a tuple of `(type, url)` pairs."""
+    __slots__ = ('advertiser_id', 'creative_id', 'display_name', 'creative_type', 'hosting_source',
+                 'update_time', 'trackers')
+
+    def __init__(self, advertiser_id, creative_id, display_name='N/A', creative_type='', hosting_source='',
+                 update_time=None, trackers=()):
+        self.advertiser_id = advertiser_id
+        self.creative_id = creative_id
+        self.display_name = display_name
+        self.creative_type = creative_type
+        self.hosting_source = hosting_source
+        self.update_time = update_time
+        self.trackers = trackers
+
+    @classmethod
+    def from_api(cls, creative):
+        return cls(
+            advertiser_id=sys.intern(str(creative.get('advertiserId'))),
+            creative_id=str(creative.get('creativeId')),
+            display_name=creative.get('displayName', 'N/A'),
+            creative_type=sys.intern(creative.get('creativeType') or ''),
+            hosting_source=sys.intern(creative.get('hostingSource') or ''),
+            update_time=creative.get('updateTime'),
+            trackers=tuple(
+                (intern_tracker_type(tracker.get('type')), tracker.get('url') or '')
+                for tracker in creative.get('thirdPartyUrls') or []
+            ),
+        )
+
+    def to_api(self):
+        """The record as a partial creative resource, e.g. for the creative cache."""
+        creative = {
+            'advertiserId': self.advertiser_id,
+            'creativeId': self.creative_id,
+            'displayName': self.display_name,
+            'thirdPartyUrls': [{'type': t, 'url': u} for t, u in self.trackers],
+        }
+        for field, value in (('creativeType', self.creative_type), ('hostingSource', self.hosting_source),
+                             ('updateTime', self.update_time)):
+            if value:
+                creative[field] = value
+        return creative
+
+    @property
+    def key(self):
+        return self.advertiser_id, self.creative_id
+
+    def __repr__(self):
+        return f"CreativeRecord({self.advertiser_id}/{self.creative_id}, {len(self.trackers)} trackers)"
+
+
+def compact_creatives(creatives):
+    """Converts API creatives to records, keeping None for failed fetches in place."""
+    return [CreativeRecord.from_api(creative) if creative else None for creative in creatives]
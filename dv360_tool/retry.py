@@ -0,0 +1,74 @@
+import random
+import time
+
+from googleapiclient.errors import HttpError
+
+DEFAULT_MAX_RETRIES = 5
+BASE_DELAY_SECONDS = 1.0
+MAX_DELAY_SECONDS = 60.0
+
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+QUOTA_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded", "RESOURCE_EXHAUSTED")
+
+
+def error_status(error):
+    """Returns the HTTP status of an API error, or None for other exceptions."""
+    if isinstance(error, HttpError):
+        return int(error.resp.status)
+    return None
+
+
+def is_quota_response(status, content):
+    """True for 429s and for 403s that DV360 uses to report exhausted quota."""
+    if status == 429:
+        return True
+    if status == 403:
+        text = content.decode('utf-8', 'replace') if isinstance(content, bytes) else (content or "")
+        return any(reason in text for reason in QUOTA_REASONS)
+    return False
+
+
+def is_quota_error(error):
+    """True when an API error reports exhausted quota."""
+    status = error_status(error)
+    return status is not None and is_quota_response(status, error.content)
+
+
+def is_transient(error):
+    """True when retrying the same request later may succeed."""
+    if error_status(error) in TRANSIENT_STATUSES or is_quota_error(error):
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given (0-based) retry."""
+    return random.uniform(0, min(MAX_DELAY_SECONDS, BASE_DELAY_SECONDS * 2 ** attempt))
+
+
+def call_with_retry(call, limiter=None, max_retries=DEFAULT_MAX_RETRIES, on_retry=None):
+    """Runs `call()` under the limiter, retrying transient errors.
+
+    Quota errors also slow the shared limiter down so the other workers back
+    off too. `on_retry(error)` is called before each retry. Returns
+    `(result, error, retries)`; exactly one of `result` and `error` is None.
+    """
+    retries = 0
+    while True:
+        if limiter:
+            limiter.acquire()
+        try:
+            result = call()
+        except Exception as e:
+            if limiter and is_quota_error(e):
+                limiter.slow_down()
+            if retries >= max_retries or not is_transient(e):
+                return None, e, retries
+            if on_retry:
+                on_retry(e)
+            time.sleep(backoff_delay(retries))
+            retries += 1
+            continue
+        if limiter:
+            limiter.speed_up()
+        return result, None, retries
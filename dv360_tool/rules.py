@@ -0,0 +1,146 @@
+"""Rule-based tracker rewrites that turn a Phase 1 sheet into a Phase 3 plan without an Excel round trip.
+
+Rules run in order over all tracker rows at once; each rule is one
+vectorised pandas operation rather than a loop over creatives.
+"""
+import json
+import re
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .trackers import TRACKER_COLUMNS, TRACKER_MAP_HOSTED_VIDEO
+
+ACTION_REPLACE = "replace"
+ACTION_REMOVE = "remove"
+ACTION_ADD = "add"
+ACTIONS = (ACTION_REPLACE, ACTION_REMOVE, ACTION_ADD)
+
+RULE_FIELDS = ["action", "event_type", "find", "replace", "regex"]
+
+CHANGE_UPDATE = "update"
+CHANGE_DELETE = "delete"
+CHANGE_ADD = "add"
+
+
+class RewriteRule(NamedTuple):
+    """One rewrite step.
+
+    `replace` rewrites `find` to `replace` in tracker URLs; `remove` drops the
+    trackers whose URL contains `find` (all of them when `find` is empty);
+    `add` gives every creative a tracker with URL `replace`. `event_type`
+    (a tracker map label) limits a rule to one event type and is required for
+    `add`; `regex` makes `find` a regular expression (with `\\1` style
+    back-references in `replace`).
+    """
+    action: str
+    find: str = ""
+    replace: str = ""
+    event_type: str = ""
+    regex: bool = False
+
+
+def parse_rules(records, tracker_map=TRACKER_MAP_HOSTED_VIDEO):
+    """Builds `RewriteRule`s from dicts (e.g. a JSON file or an edited table), skipping blank rows.
+
+    Raises `ValueError` naming the first invalid rule.
+    """
+    rules = []
+    for number, record in enumerate(records, start=1):
+        values = {field: record.get(field) for field in RULE_FIELDS}
+        text = {field: '' if pd.isna(values[field]) else str(values[field]).strip()
+                for field in ("action", "event_type", "find")}
+        replace = '' if pd.isna(values['replace']) else str(values['replace'])
+        if not any(text.values()) and not replace:
+            continue
+        action = text['action'].lower()
+        if action not in ACTIONS:
+            raise ValueError(f"Rule {number}: unknown action '{text['action']}' (use {', '.join(ACTIONS)}).")
+        if text['event_type'] and text['event_type'] not in tracker_map:
+            raise ValueError(f"Rule {number}: unknown event type '{text['event_type']}'.")
+        if action == ACTION_ADD and not (text['event_type'] and replace.strip()):
+            raise ValueError(f"Rule {number}: 'add' needs an event type and a URL in 'replace'.")
+        if action == ACTION_REPLACE and not text['find']:
+            raise ValueError(f"Rule {number}: 'replace' needs something to find.")
+        regex = values['regex'] is True or str(values['regex']).strip().lower() in ('true', '1', 'yes')
+        if regex:
+            try:
+                re.compile(text['find'])
+            except re.error as e:
+                raise ValueError(f"Rule {number}: invalid regular expression: {e}")
+        rules.append(RewriteRule(action, text['find'], replace.strip() if action == ACTION_ADD else replace,
+                                 text['event_type'], regex))
+    return rules
+
+
+def load_rules(text, tracker_map=TRACKER_MAP_HOSTED_VIDEO):
+    """Reads rules from a JSON list of objects with the `RULE_FIELDS` keys."""
+    return parse_rules(json.loads(text), tracker_map)
+
+
+def apply_rules(sheet_df, rules):
+    """Applies the rules in order and returns the edited sheet in the Phase 3 plan format.
+
+    Rewritten trackers get their new URL in `new_url`, removed ones get
+    'delete', and added ones become new rows without an `existing_url`; rows
+    the rules leave alone have an empty `new_url`. Edits already in the
+    sheet's `new_url` column are the starting point.
+    """
+    df = sheet_df[TRACKER_COLUMNS].fillna('').astype(str).reset_index(drop=True)
+    new_url = df['new_url'].str.strip()
+    removed = new_url.str.lower() == 'delete'
+    url = new_url.where((new_url != '') & ~removed, df['existing_url'].str.strip())
+    event_type = df['event_type']
+
+    for rule in rules:
+        scope = ~removed & (url != '')
+        if rule.event_type:
+            scope &= event_type == rule.event_type
+        if rule.action == ACTION_REPLACE:
+            rewritten = url[scope].str.replace(rule.find, rule.replace, regex=rule.regex)
+            url = url.mask(scope, rewritten)
+        elif rule.action == ACTION_REMOVE:
+            if rule.find:
+                scope &= url.str.contains(rule.find, regex=rule.regex)
+            removed = removed | scope
+        else:
+            present = set(zip(df['creative_id'][~removed].tolist(), event_type[~removed].tolist(),
+                              url[~removed].tolist()))
+            creatives = df.drop_duplicates('creative_id')
+            rows = creatives[[(c, rule.event_type, rule.replace) not in present
+                              for c in creatives['creative_id'].tolist()]]
+            if rows.empty:
+                continue
+            rows = rows.assign(event_type=rule.event_type, existing_url='', new_url=rule.replace)
+            df = pd.concat([df, rows], ignore_index=True)
+            url = pd.concat([url, rows['new_url']], ignore_index=True)
+            event_type = df['event_type']
+            removed = pd.concat([removed, pd.Series(False, index=rows.index)], ignore_index=True)
+
+    existing = df['existing_url'].str.strip()
+    is_new = existing == ''
+    plan = df.copy()
+    plan['new_url'] = np.select(
+        [removed & ~is_new, url != existing],
+        ['delete', url.to_numpy(dtype=object)],
+        default=''
+    )
+    # An added tracker that a later rule removed is simply not added.
+    plan = plan[~(removed & is_new & (df['new_url'] != ''))]
+    return plan.reset_index(drop=True)
+
+
+def preview_diff(plan_df):
+    """Lists the changes of a plan, one row per tracker: `change`, `before` and `after`."""
+    existing = plan_df['existing_url'].astype(str)
+    new_url = plan_df['new_url'].astype(str)
+    is_delete = new_url.str.lower() == 'delete'
+    changed = (new_url != '') & (new_url != existing)
+    diff = plan_df.loc[changed, ['advertiser_id', 'creative_id', 'creative_name', 'event_type']].copy()
+    diff['change'] = CHANGE_UPDATE
+    diff.loc[is_delete[changed], 'change'] = CHANGE_DELETE
+    diff.loc[(existing == '')[changed], 'change'] = CHANGE_ADD
+    diff['before'] = existing[changed]
+    diff['after'] = new_url[changed].where(~is_delete[changed], '')
+    return diff.sort_values('creative_id', kind='stable').reset_index(drop=True)
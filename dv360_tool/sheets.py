@@ -0,0 +1,36 @@
+import hashlib
+from io import BytesIO
+
+import pandas as pd
+
+ID_COLUMNS = ('advertiser_id', 'creative_id')
+
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = 'openpyxl'
+
+
+def content_hash(data):
+    """Returns a stable digest of an uploaded file's bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_tracker_sheet(data, file_name):
+    """Parses an edited tracker sheet (.xlsx, .csv or .csv.gz) into a string-only frame.
+
+    Every column is read as text, so large IDs never go through float
+    conversion; IDs that Excel stored as numbers lose their trailing '.0'.
+    Missing values become empty strings, like the Phase 2 validation expects.
+    """
+    if file_name.endswith('.xlsx'):
+        df = pd.read_excel(BytesIO(data), dtype=str, engine=EXCEL_ENGINE)
+    else:
+        compression = 'gzip' if file_name.endswith('.gz') else None
+        df = pd.read_csv(BytesIO(data), dtype=str, compression=compression, keep_default_na=False)
+    df = df.fillna('')
+    for column in ID_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].str.strip().str.replace(r'\.0$', '', regex=True)
+    return df
@@ -0,0 +1,223 @@
+"""Columnar snapshots of creatives' third-party trackers, for diffs and rollbacks.
+
+Every fetch, and every push with successful patches, saves the tracker lists
+it saw as one Parquet file with one row per tracker. Two snapshots are
+compared with a single outer merge, and the difference can be turned back
+into a Phase 3 plan that restores the earlier state.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .rules import CHANGE_ADD, CHANGE_DELETE
+from .trackers import TRACKER_COLUMNS, TRACKER_MAP_HOSTED_VIDEO, reverse_map
+
+DEFAULT_SNAPSHOT_DIR = os.path.join('.dv360_state', 'snapshots')
+DEFAULT_MAX_SNAPSHOTS = 200
+
+KIND_FETCH = 'fetch'
+KIND_DISCOVER = 'discover'
+KIND_PUSH = 'push'
+
+SNAPSHOT_COLUMNS = ["advertiser_id", "creative_id", "creative_name", "position", "type", "url"]
+# A creative without trackers is stored as one row at this position, so it
+# still counts as captured (with an empty list) rather than as absent.
+NO_TRACKERS = -1
+
+_KEYS = ["advertiser_id", "creative_id"]
+_METADATA_KEY = b'dv360_snapshot'
+_SNAPSHOT_ID = re.compile(r'^[0-9T]+-[a-z]+-[0-9a-f]+$')
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def snapshot_frame(creatives):
+    """Flattens `CreativeRecord`s (None entries are skipped) into snapshot rows."""
+    columns = {column: [] for column in SNAPSHOT_COLUMNS}
+    for creative in creatives or []:
+        if not creative:
+            continue
+        trackers = enumerate(creative.trackers) if creative.trackers else [(NO_TRACKERS, ('', ''))]
+        for position, (api_type, url) in trackers:
+            columns['advertiser_id'].append(str(creative.advertiser_id))
+            columns['creative_id'].append(str(creative.creative_id))
+            columns['creative_name'].append(creative.display_name or '')
+            columns['position'].append(position)
+            columns['type'].append(api_type or '')
+            columns['url'].append(url or '')
+    frame = pd.DataFrame(columns, columns=SNAPSHOT_COLUMNS)
+    return frame.astype({'position': 'int32'})
+
+
+class SnapshotStore:
+    """A directory of Parquet snapshots, newest kept up to `max_snapshots`.
+
+    Files are written to a temporary name and renamed into place, so a
+    listing never sees a partial snapshot. Thread-safe.
+    """
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_DIR, max_snapshots=DEFAULT_MAX_SNAPSHOTS):
+        self.path = path
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, snapshot_id):
+        if not _SNAPSHOT_ID.match(snapshot_id or ''):
+            raise KeyError(f"Unknown snapshot {snapshot_id!r}")
+        return os.path.join(self.path, f"{snapshot_id}.parquet")
+
+    def save(self, creatives, kind, job_id=''):
+        """Saves the tracker lists of `creatives`; returns the snapshot ID, or None when there is nothing to save."""
+        frame = snapshot_frame(creatives)
+        if frame.empty:
+            return None
+        snapshot_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{kind}-{uuid.uuid4().hex[:8]}"
+        metadata = {
+            'snapshot_id': snapshot_id,
+            'kind': kind,
+            'job_id': job_id or '',
+            'created_at': time.time(),
+            'creatives': int(frame[_KEYS].drop_duplicates().shape[0]),
+            'trackers': int((frame['position'] != NO_TRACKERS).sum()),
+        }
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               _METADATA_KEY: json.dumps(metadata).encode('utf-8')})
+        fd, temp_path = tempfile.mkstemp(dir=self.path, prefix='.snapshot-', suffix='.tmp')
+        os.close(fd)
+        try:
+            pq.write_table(table, temp_path, compression='zstd')
+            os.replace(temp_path, self._file(snapshot_id))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        self._prune()
+        return snapshot_id
+
+    def _prune(self):
+        with self._lock:
+            names = sorted(name for name in os.listdir(self.path) if name.endswith('.parquet'))
+            for name in names[:max(0, len(names) - self.max_snapshots)]:
+                try:
+                    os.unlink(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+    def snapshots(self):
+        """Lists the stored snapshots' metadata, newest first."""
+        found = []
+        for name in os.listdir(self.path):
+            if not name.endswith('.parquet'):
+                continue
+            try:
+                metadata = pq.read_schema(os.path.join(self.path, name)).metadata or {}
+            except (OSError, pa.ArrowInvalid):
+                # Pruned or replaced while listing.
+                continue
+            if _METADATA_KEY in metadata:
+                found.append(json.loads(metadata[_METADATA_KEY]))
+        return sorted(found, key=lambda m: (m['created_at'], m['snapshot_id']), reverse=True)
+
+    def load(self, snapshot_id):
+        """Reads a snapshot's rows; raises `KeyError` for an unknown ID."""
+        path = self._file(snapshot_id)
+        if not os.path.exists(path):
+            raise KeyError(f"Unknown snapshot {snapshot_id!r}")
+        return pq.read_table(path).to_pandas()
+
+
+def _tracker_rows(snapshot):
+    """The snapshot's tracker rows, numbered per repeated (creative, type, url)."""
+    rows = snapshot.loc[snapshot['position'] != NO_TRACKERS, _KEYS + ['type', 'url', 'position']]
+    rows = rows.assign(url=rows['url'].str.strip())
+    return rows.assign(occurrence=rows.groupby(_KEYS + ['type', 'url']).cumcount())
+
+
+def _changes(before, after):
+    """Outer-merges the tracker rows of the creatives both snapshots captured.
+
+    `_merge` is 'left_only' for trackers only `before` has, 'right_only' for
+    trackers only `after` has, and 'both' otherwise; only creatives with at
+    least one difference are returned.
+    """
+    shared = before[_KEYS].drop_duplicates().merge(after[_KEYS].drop_duplicates())
+    merged = _tracker_rows(before).merge(shared).merge(
+        _tracker_rows(after).merge(shared), how='outer', on=_KEYS + ['type', 'url', 'occurrence'],
+        suffixes=('_before', '_after'), indicator=True
+    )
+    differs = merged.loc[merged['_merge'] != 'both', _KEYS].drop_duplicates()
+    return merged.merge(differs)
+
+
+def _names(*snapshots):
+    """One `creative_name` per creative, taken from the first snapshot that has it."""
+    return pd.concat([s[_KEYS + ['creative_name']] for s in snapshots]).drop_duplicates(_KEYS)
+
+
+def diff_snapshots(before, after, tracker_map=TRACKER_MAP_HOSTED_VIDEO):
+    """Lists the trackers added and removed between two snapshots, one row per tracker.
+
+    Only creatives both snapshots captured are compared. Columns:
+    `advertiser_id`, `creative_id`, `creative_name`, `event_type`, `change`
+    ('add' or 'delete') and `url`.
+    """
+    changes = _changes(before, after)
+    changes = changes[changes['_merge'] != 'both']
+    labels = reverse_map(tracker_map)
+    diff = pd.DataFrame({
+        'advertiser_id': changes['advertiser_id'],
+        'creative_id': changes['creative_id'],
+        'event_type': changes['type'].map(labels).fillna(changes['type']),
+        'change': np.where(changes['_merge'] == 'left_only', CHANGE_DELETE, CHANGE_ADD),
+        'url': changes['url'],
+    }).merge(_names(after, before), how='left', on=_KEYS)
+    diff = diff[['advertiser_id', 'creative_id', 'creative_name', 'event_type', 'change', 'url']]
+    return diff.sort_values(['creative_id', 'change'], kind='stable').reset_index(drop=True)
+
+
+def rollback_plan(target, current, tracker_map=TRACKER_MAP_HOSTED_VIDEO):
+    """Builds a Phase 3 plan that takes creatives from the `current` snapshot back to `target`.
+
+    Covers every creative both snapshots captured whose trackers differ.
+    Trackers in both stay as they are, trackers only in `current` are set
+    to 'delete', and trackers only in `target` are added, so pushing the plan
+    (without keeping unlisted trackers) restores the target lists.
+    """
+    changes = _changes(current, target)
+    labels = reverse_map(tracker_map)
+    only_target = (changes['_merge'] == 'right_only').to_numpy()
+    only_current = (changes['_merge'] == 'left_only').to_numpy()
+    plan = pd.DataFrame({
+        'advertiser_id': changes['advertiser_id'],
+        'creative_id': changes['creative_id'],
+        'event_type': changes['type'].map(labels).fillna(changes['type']),
+        'existing_url': np.where(only_target, '', changes['url'].to_numpy(dtype=object)),
+        'new_url': np.select([only_target, only_current], [changes['url'].to_numpy(dtype=object), 'delete'],
+                             default=''),
+        # Current trackers keep their order; added ones follow in target order.
+        '_side': only_target.astype('int8'),
+        '_position': changes['position_before'].fillna(changes['position_after']).to_numpy(),
+    }).merge(_names(target, current), how='left', on=_KEYS)
+    plan = plan.sort_values(['creative_id', '_side', '_position'], kind='stable')
+    return plan[TRACKER_COLUMNS].reset_index(drop=True)
+
+
+def default_snapshots():
+    """Returns the process-wide snapshot store shared by every page and job."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SnapshotStore()
+        return _default_store
@@ -0,0 +1,113 @@
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+# --- Tracker Type Maps ---
+TRACKER_MAP_STANDARD = {
+    "Impression": "THIRD_PARTY_URL_TYPE_IMPRESSION",
+    "Click tracking": "THIRD_PARTY_URL_TYPE_CLICK_TRACKING",
+}
+
+TRACKER_MAP_VAST_VIDEO = {
+    "Impression": "THIRD_PARTY_URL_TYPE_VAST_IMPRESSION",
+    "Click tracking": "THIRD_PARTY_URL_TYPE_VAST_CLICK_TRACKING",
+    "Start": "THIRD_PARTY_URL_TYPE_VAST_START",
+    "First quartile": "THIRD_PARTY_URL_TYPE_VAST_FIRST_QUARTILE",
+    "Midpoint": "THIRD_PARTY_URL_TYPE_VAST_MIDPOINT",
+    "Third quartile": "THIRD_PARTY_URL_TYPE_VAST_THIRD_QUARTILE",
+    "Complete": "THIRD_PARTY_URL_TYPE_VAST_COMPLETE",
+    "Mute": "THIRD_PARTY_URL_TYPE_VAST_MUTE",
+    "Pause": "THIRD_PARTY_URL_TYPE_VAST_PAUSE",
+    "Rewind": "THIRD_PARTY_URL_TYPE_VAST_REWIND",
+    "Fullscreen": "THIRD_PARTY_URL_TYPE_VAST_FULLSCREEN",
+    "Stop": "THIRD_PARTY_URL_TYPE_VAST_STOP",
+    "Custom": "THIRD_PARTY_URL_TYPE_VAST_CUSTOM_CLICK",
+    "Skip": "THIRD_PARTY_URL_TYPE_VAST_SKIP",
+    "Progress": "THIRD_PARTY_URL_TYPE_VAST_PROGRESS"
+}
+
+TRACKER_MAP_HOSTED_VIDEO = {
+    "Impression": "THIRD_PARTY_URL_TYPE_IMPRESSION",
+    "Click tracking": "THIRD_PARTY_URL_TYPE_CLICK_TRACKING",
+    "Start": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_START",
+    "First quartile": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_FIRST_QUARTILE",
+    "Midpoint": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_MIDPOINT",
+    "Third quartile": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_THIRD_QUARTILE",
+    "Complete": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_COMPLETE",
+}
+
+TRACKER_COLUMNS = ["advertiser_id", "creative_id", "creative_name", "event_type", "existing_url", "new_url"]
+# Discovery sheets list only the matching trackers of each creative. Every row
+# of such a sheet says UNLISTED_KEEP in this column, so a push keeps the rest.
+UNLISTED_COLUMN = "unlisted_trackers"
+UNLISTED_KEEP = "keep"
+
+
+def lists_some_trackers(sheet_df):
+    """True for sheets (e.g. from discovery) whose unlisted trackers must be kept when pushed."""
+    if UNLISTED_COLUMN not in sheet_df.columns:
+        return False
+    return bool((sheet_df[UNLISTED_COLUMN].fillna('').astype(str).str.strip().str.lower() == UNLISTED_KEEP).any())
+
+
+def detect_tracker_map(creative_data):
+    creative_type = creative_data.get("creativeType")
+    hosting_source = creative_data.get("hostingSource")
+
+    if creative_type == "CREATIVE_TYPE_VIDEO":
+        if hosting_source == "HOSTING_SOURCE_HOSTED":
+            return TRACKER_MAP_HOSTED_VIDEO
+        else:
+            return TRACKER_MAP_VAST_VIDEO
+            
+    return TRACKER_MAP_STANDARD
+
+
+def reverse_map(tracker_map):
+    """Maps API tracker types back to the event type labels shown to users."""
+    return {v: k for k, v in tracker_map.items()}
+
+
+def url_domain(url):
+    """Returns the lower-cased host of a tracker URL ('' when it has none)."""
+    try:
+        return (urlsplit(url.strip()).hostname or '').lower()
+    except ValueError:
+        return ''
+
+
+def creatives_to_rows(pairs, creatives, tracker_map=TRACKER_MAP_HOSTED_VIDEO):
+    """Flattens fetched creatives into the editable tracker sheet.
+
+    `pairs` are the `(advertiser_id, creative_id)` tuples the `CreativeRecord`s
+    were fetched for, in the same order. One row per tracker, or one blank
+    row for a creative without trackers; creatives that failed to fetch
+    (None) are left out.
+    """
+    labels = reverse_map(tracker_map)
+    rows = []
+    for (advertiser_id, creative_id), details in zip(pairs, creatives):
+        if not details:
+            continue
+        trackers = details.trackers
+        creative_name = details.display_name
+        if trackers:
+            for api_type, url in trackers:
+                rows.append({
+                    "advertiser_id": advertiser_id,
+                    "creative_id": creative_id,
+                    "creative_name": creative_name,
+                    "event_type": labels.get(api_type, api_type),
+                    "existing_url": url,
+                    "new_url": ""
+                })
+        else:
+            rows.append({
+                "advertiser_id": advertiser_id,
+                "creative_id": creative_id,
+                "creative_name": creative_name,
+                "event_type": "",
+                "existing_url": "",
+                "new_url": ""
+            })
+    return pd.DataFrame(rows, columns=TRACKER_COLUMNS)
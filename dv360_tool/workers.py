@@ -0,0 +1,90 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .client import ServicePool
+
+
+class JobCancelled(Exception):
+    """Raised from a progress callback to stop a running fetch or push."""
+
+
+def run_in_pool(tasks, work, services, max_workers, on_progress=None, size=None, on_result=None):
+    """Runs `work(service, task)` for every task on a thread pool.
+
+    `services` is a `ServicePool` (or a plain factory, which gets a pool for
+    this call only); every task leases its own service, because
+    googleapiclient service objects are not safe to share between threads.
+    Returns the results in the same order as `tasks`. `size(task)` gives the
+    number of items a task covers (1 by default) so `on_progress(done, total)`
+    counts creatives rather than tasks. `on_result(index, result)` is called
+    as each task finishes. Both callbacks run on the calling thread; if one
+    raises (e.g. `JobCancelled`), tasks that have not started are dropped and
+    the exception propagates once the running ones finish.
+    """
+    size = size or (lambda task: 1)
+    if not isinstance(services, ServicePool):
+        services = ServicePool(services)
+    results = [None] * len(tasks)
+    total = sum(size(task) for task in tasks)
+    done = 0
+
+    def worker(task):
+        with services.lease() as service:
+            return work(service, task)
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        futures = {pool.submit(worker, task): i for i, task in enumerate(tasks)}
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                if on_result:
+                    on_result(i, results[i])
+                done += size(tasks[i])
+                if on_progress:
+                    on_progress(done, total)
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+
+    return results
+
+
+def fan_out(groups, run_group, max_parallel, on_progress=None):
+    """Runs `run_group(key, items, on_progress)` for every group on its own thread.
+
+    `groups` maps a key (an advertiser ID) to its list of items; at most
+    `max_parallel` groups run at once. Each group reports its own progress,
+    which is summed into `on_progress(done, total)` over all items; that
+    callback runs under a lock on the group's thread. Returns a dict from key
+    to the group's result. If a group raises (e.g. `JobCancelled`), groups
+    that have not started are dropped and the exception propagates.
+    """
+    total = sum(len(items) for items in groups.values())
+    done_by_group = {}
+    lock = threading.Lock()
+
+    def progress_for(key):
+        def report(done, _):
+            with lock:
+                done_by_group[key] = done
+                if on_progress:
+                    on_progress(sum(done_by_group.values()), total)
+        return report
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, int(max_parallel))) as pool:
+        futures = {pool.submit(run_group, key, items, progress_for(key)): key for key, items in groups.items()}
+        try:
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+    return results
+
+
+def chunked(items, size):
+    """Splits `items` into consecutive lists of at most `size` elements."""
+    size = max(1, int(size))
+    return [items[i:i + size] for i in range(0, len(items), size)]
@@ -1,13 +1,28 @@
 import streamlit as st
 import pandas as pd
-from io import BytesIO
-import os
-from openpyxl.styles import PatternFill
+import re
+import time
 
-# Import Google libraries
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from dv360_tool.auth import default_credentials
+from dv360_tool.batch import DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE
+from dv360_tool.browse import PAGE_SIZES, TrackerIndex, page_count, page_of
+from dv360_tool.cache import default_cache
+from dv360_tool.engine import (
+    LOOKUP_GET, LOOKUP_LIST, RunSettings, fresh_job_id, parse_advertiser_ids, parse_id_pairs, plan_job,
+    run_discover, run_fetch, run_push, run_rewrite, run_rollback, run_snapshot_diff, run_validate
+)
+from dv360_tool.discover import CREATIVE_TYPES, ENTITY_STATUSES, HOSTING_SOURCES, CreativeFilter
+from dv360_tool.export import EXCEL_MAX_ROWS, EXPORT_FORMATS, export_file
+from dv360_tool.fetch import DEFAULT_MAX_WORKERS
+from dv360_tool.jobs import CANCELLED, DONE, default_manager
+from dv360_tool.journal import default_journal
+from dv360_tool.metrics_panel import show_api_metrics
+from dv360_tool.ratelimit import DEFAULT_REQUESTS_PER_SECOND
+from dv360_tool.retry import DEFAULT_MAX_RETRIES
+from dv360_tool.rules import ACTIONS, RULE_FIELDS, parse_rules
+from dv360_tool.sheets import content_hash, read_tracker_sheet
+from dv360_tool.snapshots import default_snapshots
+from dv360_tool.trackers import TRACKER_MAP_HOSTED_VIDEO, lists_some_trackers
 
 st.set_page_config(
     page_title="Bulk Creative Updater",
@@ -16,77 +31,95 @@ st.set_page_config(
 
 st.title("Bulk Creative Updater Workflow")
 
-# --- Tracker Type Maps ---
-TRACKER_MAP_HOSTED_VIDEO = {
-    "Impression": "THIRD_PARTY_URL_TYPE_IMPRESSION",
-    "Click tracking": "THIRD_PARTY_URL_TYPE_CLICK_TRACKING",
-    "Start": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_START",
-    "First quartile": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_FIRST_QUARTILE",
-    "Midpoint": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_MIDPOINT",
-    "Third quartile": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_THIRD_QUARTILE",
-    "Complete": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_COMPLETE",
-}
-
 # --- Authentication ---
-SCOPES = ['https://www.googleapis.com/auth/display-video']
-
 def get_creds():
-    if 'creds' in st.session_state and st.session_state.creds and st.session_state.creds.valid:
-        return st.session_state.creds
-    if os.path.exists('token.json'):
-        try:
-            creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-            if creds and creds.valid:
-                st.session_state.creds = creds
-                return creds
-        except Exception as e:
-            st.warning(f"Could not load token.json: {e}. Please re-authenticate on the main page.")
-            return None
-    st.error("You are not logged in. Please go to the 'app.py' welcome page to authenticate.")
-    return None
-
-def fetch_creative_details(service, advertiser_id, creative_id):
-    """Makes a live API call to fetch creative details."""
     try:
-        request = service.advertisers().creatives().get(
-            advertiserId=advertiser_id,
-            creativeId=creative_id
-        )
-        return request.execute()
+        creds = default_credentials().get()
     except Exception as e:
-        st.error(f"Failed to fetch Creative ID {creative_id}: {e}")
+        st.warning(f"Could not load token.json: {e}. Please re-authenticate on the main page.")
         return None
+    if creds:
+        st.session_state.creds = creds
+        return creds
+    st.error("You are not logged in. Please go to the 'app.py' welcome page to authenticate.")
+    return None
 
-def generate_excel_file(df, is_report=False):
-    """Generates a color-coded Excel file in memory."""
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Trackers')
-        workbook = writer.book
-        worksheet = writer.sheets['Trackers']
-        
-        light_grey_fill = PatternFill(start_color='E7E6E6', end_color='E7E6E6', fill_type='solid')
-        
-        if is_report:
-            failed_fill = PatternFill(start_color='FFD6D6', end_color='FFD6D6', fill_type='solid') # Red
-
-            for row_num, row_data in enumerate(df.itertuples(index=False), start=2):
-                status = getattr(row_data, 'upload_status', '')
-                if status == '❌ Failed':
-                    for col_num in range(1, len(df.columns) + 1):
-                        worksheet.cell(row=row_num, column=col_num).fill = failed_fill
-        else:
-            current_creative_id = None
-            use_grey = False
-            for row_num, row_data in enumerate(df.itertuples(index=False), start=2):
-                if str(row_data.creative_id) != str(current_creative_id):
-                    current_creative_id = str(row_data.creative_id)
-                    use_grey = not use_grey
-                if use_grey:
-                    for col_num in range(1, len(df.columns) + 1):
-                        worksheet.cell(row=row_num, column=col_num).fill = light_grey_fill
-
-    return output.getvalue()
+def export_download(df, format_label, is_report=False):
+    """Returns the export bytes for a sheet, memoised so reruns don't regenerate it.
+
+    Each entry keeps the frame it was made from: ids are reused once a frame
+    is freed, so a hit also has to be the very same object.
+    """
+    extension, _ = EXPORT_FORMATS[format_label]
+    exports = st.session_state.setdefault('exports', {})
+    key = (id(df), extension, is_report)
+    cached = exports.get(key)
+    if cached is None or cached[0] is not df:
+        if len(exports) >= 4:
+            exports.clear()
+        cached = exports[key] = (df, export_file(df, extension, is_report=is_report))
+    return cached[1]
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def parse_edited_file(digest, file_name, _data):
+    """Parses an uploaded sheet once per content hash; reruns reuse the cached frame."""
+    return read_tracker_sheet(_data, file_name)
+
+@st.fragment(run_every=1)
+def show_job_progress(session_key, label):
+    """Polls a background job; reruns the whole page once it has finished."""
+    job = default_manager().get(st.session_state.get(session_key))
+    if job is None:
+        return
+    if job.finished:
+        st.rerun()
+    eta = f"{job.eta:.0f}s" if job.eta is not None else "estimating..."
+    unit = "advertisers" if job.kind == 'discover' else "creatives"
+    st.progress(
+        job.done / job.total if job.total else 0.0,
+        text=f"{label}: {job.done}/{job.total} {unit} · {job.throughput:.1f}/s · ETA {eta}"
+    )
+    if job.cancel_requested:
+        st.caption("Cancelling after the requests already in flight...")
+    elif st.button("Cancel", key=f"cancel_{session_key}"):
+        job.cancel()
+
+@st.fragment
+def show_results(index):
+    """Filters and pages the tracker index; only this fragment reruns while browsing."""
+    search_col, type_col, domain_col = st.columns([3, 2, 2])
+    query = search_col.text_input("Search by creative ID, name or tracker domain", key="results_query")
+    event_types = type_col.multiselect("Event types", index.event_types, key="results_event_types")
+    domains = domain_col.multiselect("Tracker domains", index.domains, key="results_domains")
+    matches = index.search(query, event_types, domains)
+
+    size_col, page_col, count_col = st.columns([1, 1, 3])
+    page_size = size_col.selectbox("Rows per page", PAGE_SIZES, index=1, key="results_page_size")
+    pages = page_count(matches, page_size)
+    if st.session_state.get('results_page', 1) > pages:
+        # The filters shrank the result, so jump back onto an existing page.
+        st.session_state.results_page = pages
+    page_number = page_col.number_input("Page", min_value=1, max_value=pages, key="results_page")
+    count_col.caption(
+        f"{len(matches)} of {len(index)} trackers · {matches['creative_id'].nunique()} of "
+        f"{index.creative_count} creatives · page {page_number} of {pages}"
+    )
+    st.dataframe(page_of(matches, page_number, page_size), hide_index=True)
+
+def collect_job(session_key):
+    """Returns the session's background job once it has finished, and forgets it."""
+    if session_key not in st.session_state:
+        return None
+    job = default_manager().get(st.session_state[session_key])
+    if job is None:
+        # The job is gone (e.g. the server restarted), so stop waiting for it.
+        del st.session_state[session_key]
+        return None
+    if not job.finished:
+        return None
+    del st.session_state[session_key]
+    default_manager().forget(job.job_id)
+    return job
 
 # --- Main UI ---
 creds = get_creds()
@@ -101,188 +134,363 @@ if creds:
         st.session_state.update_plan = None
     if 'final_upload_report' not in st.session_state:
         st.session_state.final_upload_report = None
+    if 'validation' not in st.session_state:
+        st.session_state.validation = None
+    if 'fetch_errors' not in st.session_state:
+        st.session_state.fetch_errors = []
+    if 'keep_unlisted' not in st.session_state:
+        st.session_state.keep_unlisted = False
 
+    # --- Collect Finished Background Jobs ---
+    fetch_job = collect_job('fetch_job_id')
+    if fetch_job is not None:
+        if fetch_job.status == DONE and fetch_job.kind == 'discover':
+            creatives, processed_df, errors, scanned = fetch_job.result
+            st.session_state.individual_results = creatives
+            st.session_state.results_index = TrackerIndex.from_records(creatives)
+            st.session_state.processed_df = processed_df
+            st.session_state.fetch_errors = [(advertiser_id, None, str(error)) for advertiser_id, error in errors]
+            st.session_state.keep_unlisted = True
+            st.success(f"Discovery complete: {len(creatives)} of {scanned} creatives matched, {len(processed_df)} trackers.")
+        elif fetch_job.status == DONE:
+            creatives, processed_df, errors = fetch_job.result
+            st.session_state.individual_results = creatives
+            st.session_state.results_index = TrackerIndex.from_records(creatives)
+            st.session_state.processed_df = processed_df
+            st.session_state.fetch_errors = [(advertiser_id, creative_id, str(error))
+                                             for advertiser_id, creative_id, error in errors]
+            st.session_state.keep_unlisted = False
+            st.success("Data extraction complete.")
+        elif fetch_job.status == CANCELLED:
+            st.warning("The fetch was cancelled.")
+        else:
+            st.error(f"An error occurred: {fetch_job.error}")
+
+    push_job = collect_job('push_job_id')
+    if push_job is not None:
+        if push_job.status in (DONE, CANCELLED):
+            report_df, summary, _ = push_job.result
+            st.session_state.final_upload_report = report_df
+            if summary['cancelled']:
+                st.warning(
+                    f"The push was cancelled: {summary['pending']} creatives were not sent. "
+                    "Send the same plan again to resume it."
+                )
+            else:
+                st.success(f"All updates have been processed! {summary['sent']} creatives sent, {summary['unchanged']} unchanged and skipped.")
+                if summary['earlier']:
+                    st.caption(f"{summary['earlier']} creatives were already done by an earlier run of job "
+                               f"`{summary['job_id']}` and were not sent again.")
+                if summary.get('snapshot_id'):
+                    st.caption(f"The new trackers were saved as snapshot `{summary['snapshot_id']}`; "
+                               "use 'Tracker snapshots and rollback' to undo the push.")
+                for key in ['processed_df', 'individual_results', 'results_index', 'update_plan', 'validation',
+                            'keep_unlisted', 'rewrite_diff']:
+                    if key in st.session_state:
+                        del st.session_state[key]
+        else:
+            st.error(f"An error occurred during the final update: {push_job.error}")
+
+    with st.expander("API request settings"):
+        max_workers = st.number_input("Concurrent requests", min_value=1, max_value=64, value=DEFAULT_MAX_WORKERS,
+                                      help="Shared evenly between advertisers when the file spans several.")
+        requests_per_second = st.number_input("Max requests per second", min_value=1, max_value=100, value=DEFAULT_REQUESTS_PER_SECOND)
+        max_retries = st.number_input("Retries for rate-limited or failed calls", min_value=0, max_value=10, value=DEFAULT_MAX_RETRIES)
+        use_batches = st.checkbox("Group calls into batch requests")
+        batch_size = st.number_input("Calls per batch", min_value=1, max_value=MAX_BATCH_SIZE, value=DEFAULT_BATCH_SIZE, disabled=not use_batches)
+        lookup_mode = st.radio(
+            "Phase 1 lookup",
+            [LOOKUP_GET, LOOKUP_LIST],
+            format_func={LOOKUP_GET: "One request per creative ID", LOOKUP_LIST: "Filtered list lookup"}.get,
+            help="The list lookup fetches many IDs per call and only the fields this page uses."
+        )
+        use_cache = st.checkbox("Reuse recently fetched creatives from the local cache", value=True)
+        if st.button("Clear creative cache"):
+            default_cache().clear()
+        settings = RunSettings(
+            max_workers=max_workers,
+            requests_per_second=requests_per_second,
+            max_retries=max_retries,
+            use_batches=use_batches,
+            batch_size=batch_size,
+            lookup_mode=lookup_mode,
+            use_cache=use_cache
+        )
 
     # --- Phase 1: Uploader ---
     st.header("Phase 1: Upload Creative IDs")
-    advertiser_id_input = st.text_input("Enter the Advertiser ID for all creatives")
-    uploaded_ids_file = st.file_uploader("Upload a one-column CSV with your Creative IDs", type="csv")
+    find_mode = st.radio("How to find the creatives", ["Upload Creative IDs", "Discover by tracker"], horizontal=True)
 
-    if st.button("Process IDs and Show Results"):
-        if uploaded_ids_file and advertiser_id_input:
-            try:
-                raw_text = uploaded_ids_file.getvalue().decode('utf-8')
-                lines = raw_text.splitlines()
-                creative_ids = [line.strip() for line in lines if line.strip() and line.strip().lower() != 'creative_id']
+    if find_mode == "Upload Creative IDs":
+        advertiser_id_input = st.text_input(
+            "Advertiser ID (for a one-column file of Creative IDs)",
+            help="Leave empty when the file has advertiser_id,creative_id pairs."
+        )
+        uploaded_ids_file = st.file_uploader(
+            "Upload a CSV of advertiser_id,creative_id pairs, or a one-column CSV of Creative IDs", type="csv"
+        )
 
-                if not creative_ids:
-                    st.error("The uploaded file contains no valid Creative IDs.")
-                else:
-                    service = build('displayvideo', 'v3', credentials=creds)
-                    all_trackers_data = []
-                    individual_results_list = []
-                    
-                    with st.spinner(f"Fetching data for {len(creative_ids)} creatives..."):
-                        progress_bar = st.progress(0)
-                        for i, creative_id in enumerate(creative_ids):
-                            details = fetch_creative_details(service, advertiser_id_input, creative_id)
-                            individual_results_list.append(details)
-                            
-                            if details:
-                                trackers = details.get("thirdPartyUrls", [])
-                                creative_name = details.get("displayName", "N/A")
-                                reverse_map = {v: k for k, v in TRACKER_MAP_HOSTED_VIDEO.items()}
-
-                                if trackers:
-                                    for tracker in trackers:
-                                        api_type = tracker.get('type')
-                                        event_type = reverse_map.get(api_type, api_type)
-                                        all_trackers_data.append({
-                                            "advertiser_id": advertiser_id_input,
-                                            "creative_id": creative_id,
-                                            "creative_name": creative_name,
-                                            "event_type": event_type,
-                                            "existing_url": tracker.get("url"),
-                                            "new_url": ""
-                                        })
-                                else:
-                                    all_trackers_data.append({
-                                        "advertiser_id": advertiser_id_input,
-                                        "creative_id": creative_id,
-                                        "creative_name": creative_name,
-                                        "event_type": "",
-                                        "existing_url": "",
-                                        "new_url": ""
-                                    })
-                            progress_bar.progress((i + 1) / len(creative_ids))
-                    
-                    st.session_state.individual_results = individual_results_list
-                    st.session_state.processed_df = pd.DataFrame(all_trackers_data)
-                    st.success("Data extraction complete.")
-            except Exception as e:
-                st.error(f"An error occurred: {e}")
-        else:
-            st.warning("Please provide an Advertiser ID and upload a file.")
+        if st.button("Process IDs and Show Results", disabled='fetch_job_id' in st.session_state):
+            if uploaded_ids_file:
+                try:
+                    pairs = parse_id_pairs(uploaded_ids_file.getvalue().decode('utf-8'), advertiser_id_input)
+
+                    if not pairs:
+                        st.error("The uploaded file contains no valid Creative IDs.")
+                    else:
+                        advertisers = len({advertiser_id for advertiser_id, _ in pairs})
+                        if advertisers > 1:
+                            st.info(f"Fetching {len(pairs)} creatives across {advertisers} advertisers.")
+                        job = default_manager().submit('fetch', run_fetch, creds, pairs, settings)
+                        st.session_state.fetch_job_id = job.job_id
+                except ValueError as e:
+                    st.warning(f"{e} Enter an Advertiser ID or add an advertiser_id column.")
+                except Exception as e:
+                    st.error(f"An error occurred: {e}")
+            else:
+                st.warning("Please upload a file.")
+    else:
+        st.info(
+            "Scans every creative of the advertisers and keeps only the trackers that match. "
+            "Trackers not in the downloaded sheet are left as they are when you push it."
+        )
+        discover_advertisers = st.text_area("Advertiser IDs (comma or line separated)")
+        discover_domains = st.text_input("Tracker domains (comma separated, subdomains included)")
+        discover_pattern = st.text_input("Tracker URL pattern (regular expression)")
+        discover_types = st.multiselect("Creative types", CREATIVE_TYPES)
+        discover_hosting = st.multiselect("Hosting sources", HOSTING_SOURCES)
+        discover_statuses = st.multiselect("Entity statuses", ENTITY_STATUSES)
+
+        if st.button("Discover Creatives", disabled='fetch_job_id' in st.session_state):
+            advertiser_ids = parse_advertiser_ids(discover_advertisers)
+            if not advertiser_ids:
+                st.warning("Please enter at least one Advertiser ID.")
+            else:
+                try:
+                    creative_filter = CreativeFilter(
+                        domains=tuple(discover_domains.split(',')),
+                        url_pattern=discover_pattern.strip(),
+                        creative_types=tuple(discover_types),
+                        hosting_sources=tuple(discover_hosting),
+                        entity_statuses=tuple(discover_statuses)
+                    )
+                    job = default_manager().submit('discover', run_discover, creds, advertiser_ids, creative_filter, settings)
+                    st.session_state.fetch_job_id = job.job_id
+                except re.error as e:
+                    st.error(f"The URL pattern is not a valid regular expression: {e}")
+
+    if 'fetch_job_id' in st.session_state:
+        show_job_progress('fetch_job_id', "Fetching")
+
+    if st.session_state.fetch_errors:
+        errors = st.session_state.fetch_errors
+        st.error(f"{len(errors)} creatives could not be fetched.")
+        for advertiser_id, creative_id, error in errors[:20]:
+            if creative_id is None:
+                st.error(f"Failed to list the creatives of Advertiser ID {advertiser_id}: {error}")
+            else:
+                st.error(f"Failed to fetch Creative ID {creative_id} (Advertiser {advertiser_id}): {error}")
 
     # --- Display Results and Global Download Button ---
-    if st.session_state.get('individual_results'):
+    if st.session_state.get('results_index') is not None:
         st.header("Extracted Creative Details")
-        st.info("Click on each creative to view its trackers.")
-        for creative_data in st.session_state.individual_results:
-            if creative_data:
-                name = creative_data.get('displayName', 'N/A')
-                c_id = creative_data.get('creativeId', 'N/A')
-                with st.expander(f"Creative: {name} (ID: {c_id})"):
-                    trackers = creative_data.get("thirdPartyUrls", [])
-                    if trackers:
-                        reverse_map = {v: k for k, v in TRACKER_MAP_HOSTED_VIDEO.items()}
-                        display_data = [{"event_type": reverse_map.get(t.get('type'), t.get('type')), "url": t.get('url')} for t in trackers]
-                        st.dataframe(pd.DataFrame(display_data))
-                    else:
-                        st.write("No third-party trackers found.")
+        show_results(st.session_state.results_index)
 
     if st.session_state.get('processed_df') is not None and not st.session_state.processed_df.empty:
         st.header("Download Combined File")
-        excel_data = generate_excel_file(st.session_state.processed_df)
+        processed_df = st.session_state.processed_df
+        format_options = list(EXPORT_FORMATS)
+        if len(processed_df) > EXCEL_MAX_ROWS:
+            format_options.remove("Excel (.xlsx)")
+        export_format = st.selectbox("File format", format_options, key="export_format",
+                                     help="CSV exports are much faster for very large tracker sheets.")
+        extension, mime = EXPORT_FORMATS[export_format]
         st.download_button(
-            label="📥 Download Combined Excel File to Edit",
-            data=excel_data,
-            file_name="dv360_trackers_to_edit.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            label="📥 Download Combined File to Edit",
+            data=export_download(processed_df, export_format),
+            file_name=f"dv360_trackers_to_edit.{extension}",
+            mime=mime
         )
 
 
+    # --- Phase 2 Alternative: Rewrite Rules ---
+    if st.session_state.get('processed_df') is not None and not st.session_state.processed_df.empty:
+        with st.expander("Rewrite trackers with rules instead of editing the file"):
+            st.caption(
+                "Rules run in order. **replace** rewrites *find* to *replace* in tracker URLs, "
+                "**remove** drops trackers whose URL contains *find* (all of the event type when empty), "
+                "**add** gives every creative a tracker of the event type with the URL in *replace*. "
+                "Tick *regex* to use regular expressions."
+            )
+            rules_df = st.data_editor(
+                pd.DataFrame(columns=RULE_FIELDS).astype({'regex': bool}),
+                num_rows="dynamic",
+                key="rewrite_rules",
+                column_config={
+                    'action': st.column_config.SelectboxColumn("action", options=list(ACTIONS), required=True),
+                    'event_type': st.column_config.SelectboxColumn("event_type", options=list(TRACKER_MAP_HOSTED_VIDEO)),
+                    'regex': st.column_config.CheckboxColumn("regex", default=False),
+                }
+            )
+            if st.button("Preview Rewrite"):
+                try:
+                    rules = parse_rules(rules_df.to_dict('records'))
+                    if not rules:
+                        st.warning("Please add at least one rule.")
+                    else:
+                        plan_df, diff_df, counts = run_rewrite(st.session_state.processed_df, rules)
+                        st.session_state.update_plan = plan_df
+                        st.session_state.rewrite_diff = diff_df
+                        st.session_state.validation = {'digest': None, 'counts': counts, 'job_id': plan_job(plan_df)}
+                except ValueError as e:
+                    st.error(str(e))
+
+            diff_df = st.session_state.get('rewrite_diff')
+            if diff_df is not None:
+                counts = st.session_state.validation['counts'] if st.session_state.get('validation') else None
+                if counts:
+                    st.write(
+                        f"🟢 {counts['adds']} to add · 🔴 {counts['deletes']} to delete · "
+                        f"🔵 {counts['updates']} to update · ⚪ {counts['no_change']} unchanged"
+                    )
+                if diff_df.empty:
+                    st.info("The rules change nothing.")
+                else:
+                    st.dataframe(diff_df.head(1000), hide_index=True)
+                    if len(diff_df) > 1000:
+                        st.caption(f"Showing the first 1,000 of {len(diff_df)} changes.")
+
     # --- Phase 2: Upload Edited File for Validation and Review ---
     st.header("Phase 2: Upload Your Edited Excel File")
     st.info("To delete a tracker, type 'delete' in the `new_url` column. To add a tracker, add a new row and fill in the `new_url`.")
-    edited_file = st.file_uploader("Upload the Excel file you edited", type="xlsx")
+    edited_file = st.file_uploader("Upload the Excel or CSV file you edited", type=["xlsx", "csv", "gz"])
 
     if edited_file:
         if st.button("Validate and Review Changes"):
             try:
                 with st.spinner("Validating file..."):
-                    edited_df = pd.read_excel(edited_file).fillna('')
-                    
-                    deletes = edited_df[edited_df['new_url'].str.lower() == 'delete']
-                    adds = edited_df[edited_df['existing_url'] == '']
-                    updates = edited_df[(edited_df['new_url'] != '') & (edited_df['new_url'].str.lower() != 'delete') & (edited_df['existing_url'] != '')]
-                    no_change = edited_df[(edited_df['new_url'] == '') & (edited_df['existing_url'] != '')]
-
-                    st.subheader("Validation Complete")
-                    st.write(f"🟢 **Trackers to be Added:** {len(adds)}")
-                    st.write(f"🔴 **Trackers to be Deleted:** {len(deletes)}")
-                    st.write(f"🔵 **Trackers to be Updated:** {len(updates)}")
-                    st.write(f"⚪ **Trackers with No Change:** {len(no_change)}")
-                    
-                    st.session_state.update_plan = edited_df
+                    data = edited_file.getvalue()
+                    digest = content_hash(data)
+                    validation = st.session_state.validation
+                    if validation is None or validation['digest'] != digest:
+                        edited_df = parse_edited_file(digest, edited_file.name, data)
+                        st.session_state.validation = {
+                            'digest': digest,
+                            'counts': run_validate(edited_df),
+                            'job_id': plan_job(edited_df)
+                        }
+                        st.session_state.update_plan = edited_df
+                        st.session_state.rewrite_diff = None
             except Exception as e:
                 st.error(f"An error occurred during validation: {e}")
 
+        if st.session_state.validation is not None:
+            counts = st.session_state.validation['counts']
+            st.subheader("Validation Complete")
+            st.write(f"🟢 **Trackers to be Added:** {counts['adds']}")
+            st.write(f"🔴 **Trackers to be Deleted:** {counts['deletes']}")
+            st.write(f"🔵 **Trackers to be Updated:** {counts['updates']}")
+            st.write(f"⚪ **Trackers with No Change:** {counts['no_change']}")
+
+    # --- Snapshots and Rollback ---
+    with st.expander("Tracker snapshots and rollback"):
+        snapshots = default_snapshots().snapshots()
+        if not snapshots:
+            st.caption("Every fetch and every successful push saves a snapshot of the trackers it saw. There are none yet.")
+        else:
+            labels = {
+                m['snapshot_id']: f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(m['created_at']))} · "
+                                  f"{m['kind']} · {m['creatives']} creatives"
+                for m in snapshots
+            }
+            snapshot_ids = list(labels)
+            target_col, current_col = st.columns(2)
+            target_id = target_col.selectbox("Restore to", snapshot_ids, index=min(1, len(snapshot_ids) - 1),
+                                             format_func=labels.get, key="rollback_target",
+                                             help="E.g. the fetch taken before a bad push.")
+            current_id = current_col.selectbox("Undo the state in", snapshot_ids, format_func=labels.get,
+                                               key="rollback_current", help="E.g. the snapshot of the bad push.")
+            compare_col, rollback_col = st.columns(2)
+            if compare_col.button("Compare Snapshots"):
+                st.session_state.snapshot_diff = run_snapshot_diff(target_id, current_id)
+            if rollback_col.button("Build Rollback Plan"):
+                plan_df, diff_df, counts = run_rollback(target_id, current_id)
+                if plan_df.empty:
+                    st.info("The creatives in both snapshots have the same trackers; there is nothing to roll back.")
+                else:
+                    st.session_state.update_plan = plan_df
+                    st.session_state.rewrite_diff = None
+                    st.session_state.validation = {'digest': None, 'counts': counts, 'job_id': plan_job(plan_df)}
+                    st.session_state.keep_unlisted = False
+                    st.success(
+                        f"Rollback plan ready for {plan_df['creative_id'].nunique()} creatives: "
+                        f"{counts['adds']} trackers to restore, {counts['deletes']} to delete. Review it in Phase 3."
+                    )
+
+            snapshot_diff = st.session_state.get('snapshot_diff')
+            if snapshot_diff is not None:
+                st.write(
+                    f"{snapshot_diff['creative_id'].nunique()} creatives differ: "
+                    f"🟢 {int((snapshot_diff['change'] == 'add').sum())} trackers only in the state to undo · "
+                    f"🔴 {int((snapshot_diff['change'] == 'delete').sum())} only in the state to restore"
+                )
+                st.dataframe(snapshot_diff.head(1000), hide_index=True)
+                if len(snapshot_diff) > 1000:
+                    st.caption(f"Showing the first 1,000 of {len(snapshot_diff)} changes.")
+
     # --- Phase 3: Final Confirmation ---
     if st.session_state.get('update_plan') is not None:
         st.header("Phase 3: Confirm and Push to DV360")
-        st.warning("⚠️ **FINAL WARNING:** This action is irreversible.")
+        st.warning("⚠️ **FINAL WARNING:** This changes live creatives. The result is saved as a snapshot you can roll back from.")
         
-        if st.button("Confirm and Send to DV360", type="primary"):
-            try:
-                with st.spinner("Sending updates to the DV360 API..."):
-                    plan_df = st.session_state.update_plan
-                    service = build('displayvideo', 'v3', credentials=creds)
-                    
-                    upload_results_list = []
-                    
-                    # Add the progress bar for the final update
-                    progress_bar = st.progress(0)
-                    creative_groups = list(plan_df.groupby('creative_id'))
-                    total_creatives = len(creative_groups)
-
-                    for i, (creative_id, group) in enumerate(creative_groups):
-                        final_trackers = []
-                        adv_id = group['advertiser_id'].iloc[0]
-                        
-                        for _, row in group.iterrows():
-                            if row['new_url'].lower() != 'delete':
-                                url_to_use = row['new_url'] if str(row['new_url']).strip() else row['existing_url']
-                                if str(row['event_type']).strip() and str(url_to_use).strip():
-                                    api_type = TRACKER_MAP_HOSTED_VIDEO.get(row['event_type'], row['event_type'])
-                                    final_trackers.append({"type": api_type, "url": str(url_to_use).strip()})
-                        
-                        status = "✅ Success"
-                        details_msg = ""
-                        try:
-                            service.advertisers().creatives().patch(
-                                advertiserId=str(adv_id),
-                                creativeId=str(creative_id),
-                                updateMask="thirdPartyUrls",
-                                body={"thirdPartyUrls": final_trackers}
-                            ).execute()
-                        except Exception as e:
-                            status = "❌ Failed"
-                            details_msg = str(e)
-                        
-                        group['upload_status'] = status
-                        group['details'] = details_msg
-                        upload_results_list.append(group)
-                        
-                        progress_bar.progress((i + 1) / total_creatives)
-
-                    st.session_state.final_upload_report = pd.concat(upload_results_list)
-                    st.success("All updates have been processed!")
-                    
-                    for key in ['processed_df', 'individual_results', 'update_plan']:
-                        if key in st.session_state:
-                            del st.session_state[key]
+        job_id = st.session_state.validation['job_id'] if st.session_state.get('validation') else None
+        resumable = default_journal().resumable_run(job_id) if job_id else None
+        start_fresh = False
+        if resumable:
+            counts = default_journal().counts(resumable)
+            st.info(
+                f"An earlier push of this plan did not finish (job `{resumable}`): "
+                f"{counts.get('success', 0)} succeeded, {counts.get('unchanged', 0)} unchanged, "
+                f"{counts.get('failed', 0)} failed, {counts.get('pending', 0)} pending. "
+                "Sending again only retries the failed and pending creatives."
+            )
+            start_fresh = st.checkbox("Send every creative again as a new job")
+        keep_unlisted = st.checkbox(
+            "The sheet lists only some trackers of each creative; keep the others",
+            value=st.session_state.get('keep_unlisted', False) or lists_some_trackers(st.session_state.update_plan),
+            help="On for sheets from discovery. Off: trackers missing from the sheet are removed."
+        )
 
-            except Exception as e:
-                st.error(f"An error occurred during the final update: {e}")
+        if st.button("Confirm and Send to DV360", type="primary", disabled='push_job_id' in st.session_state):
+            plan_df = st.session_state.update_plan
+            job = default_manager().submit(
+                'push', run_push, creds, plan_df, settings,
+                fetched_creatives=st.session_state.get('individual_results'),
+                job_id=fresh_job_id(plan_df) if start_fresh else None,
+                keep_unlisted=keep_unlisted
+            )
+            st.session_state.push_job_id = job.job_id
+
+    if 'push_job_id' in st.session_state:
+        show_job_progress('push_job_id', "Sending updates to the DV360 API")
     
     # --- Final Report Download ---
     if st.session_state.get('final_upload_report') is not None:
         st.header("Download Upload Status Report")
-        report_excel = generate_excel_file(st.session_state.final_upload_report, is_report=True)
+        report_df = st.session_state.final_upload_report
+        format_options = list(EXPORT_FORMATS)
+        if len(report_df) > EXCEL_MAX_ROWS:
+            format_options.remove("Excel (.xlsx)")
+        report_format = st.selectbox("Report format", format_options, key="report_format")
+        extension, mime = EXPORT_FORMATS[report_format]
         st.download_button(
             label="📊 Download Upload Status Report",
-            data=report_excel,
-            file_name="upload_status_report.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            data=export_download(report_df, report_format, is_report=True),
+            file_name=f"upload_status_report.{extension}",
+            mime=mime
         )
+
+    # --- API Metrics ---
+    with st.expander("API metrics"):
+        st.caption("Latency, status codes, retries and quota errors per operation and advertiser, since the last reset.")
+        show_api_metrics()
@@ -1,9 +1,14 @@
 import streamlit as st
 import pandas as pd
-import os
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+
+from dv360_tool.auth import default_credentials
+from dv360_tool.cache import default_cache
+from dv360_tool.client import service_pool
+from dv360_tool.fetch import fetch_creative_details
+from dv360_tool.metrics_panel import show_api_metrics
+from dv360_tool.plan import final_trackers as build_final_trackers
+from dv360_tool.push import patch_creative
+from dv360_tool.trackers import TRACKER_MAP_STANDARD, detect_tracker_map, reverse_map
 
 st.set_page_config(
     page_title="Single Creative Updater",
@@ -12,65 +17,16 @@ st.set_page_config(
 
 st.title("Single Creative Updater")
 
-# --- Tracker Type Maps ---
-TRACKER_MAP_STANDARD = {
-    "Impression": "THIRD_PARTY_URL_TYPE_IMPRESSION",
-    "Click tracking": "THIRD_PARTY_URL_TYPE_CLICK_TRACKING",
-}
-
-TRACKER_MAP_VAST_VIDEO = {
-    "Impression": "THIRD_PARTY_URL_TYPE_VAST_IMPRESSION",
-    "Click tracking": "THIRD_PARTY_URL_TYPE_VAST_CLICK_TRACKING",
-    "Start": "THIRD_PARTY_URL_TYPE_VAST_START",
-    "First quartile": "THIRD_PARTY_URL_TYPE_VAST_FIRST_QUARTILE",
-    "Midpoint": "THIRD_PARTY_URL_TYPE_VAST_MIDPOINT",
-    "Third quartile": "THIRD_PARTY_URL_TYPE_VAST_THIRD_QUARTILE",
-    "Complete": "THIRD_PARTY_URL_TYPE_VAST_COMPLETE",
-    "Mute": "THIRD_PARTY_URL_TYPE_VAST_MUTE",
-    "Pause": "THIRD_PARTY_URL_TYPE_VAST_PAUSE",
-    "Rewind": "THIRD_PARTY_URL_TYPE_VAST_REWIND",
-    "Fullscreen": "THIRD_PARTY_URL_TYPE_VAST_FULLSCREEN",
-    "Stop": "THIRD_PARTY_URL_TYPE_VAST_STOP",
-    "Custom": "THIRD_PARTY_URL_TYPE_VAST_CUSTOM_CLICK",
-    "Skip": "THIRD_PARTY_URL_TYPE_VAST_SKIP",
-    "Progress": "THIRD_PARTY_URL_TYPE_VAST_PROGRESS"
-}
-
-TRACKER_MAP_HOSTED_VIDEO = {
-    "Impression": "THIRD_PARTY_URL_TYPE_IMPRESSION",
-    "Click tracking": "THIRD_PARTY_URL_TYPE_CLICK_TRACKING",
-    "Start": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_START",
-    "First quartile": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_FIRST_QUARTILE",
-    "Midpoint": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_MIDPOINT",
-    "Third quartile": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_THIRD_QUARTILE",
-    "Complete": "THIRD_PARTY_URL_TYPE_AUDIO_VIDEO_COMPLETE",
-}
-
 # --- Functions ---
-def detect_tracker_map(creative_data):
-    creative_type = creative_data.get("creativeType")
-    hosting_source = creative_data.get("hostingSource")
-
-    if creative_type == "CREATIVE_TYPE_VIDEO":
-        if hosting_source == "HOSTING_SOURCE_HOSTED":
-            return TRACKER_MAP_HOSTED_VIDEO
-        else:
-            return TRACKER_MAP_VAST_VIDEO
-            
-    return TRACKER_MAP_STANDARD
-
 def get_creds():
-    if 'creds' in st.session_state and st.session_state.creds and st.session_state.creds.valid:
-        return st.session_state.creds
-    if os.path.exists('token.json'):
-        try:
-            creds = Credentials.from_authorized_user_file('token.json', ['https://www.googleapis.com/auth/display-video'])
-            if creds and creds.valid:
-                st.session_state.creds = creds
-                return creds
-        except Exception as e:
-            st.warning(f"Could not load token.json: {e}. Please re-authenticate on the main page.")
-            return None
+    try:
+        creds = default_credentials().get()
+    except Exception as e:
+        st.warning(f"Could not load token.json: {e}. Please re-authenticate on the main page.")
+        return None
+    if creds:
+        st.session_state.creds = creds
+        return creds
     st.error("You are not logged in. Please go to the 'app.py' welcome page to authenticate.")
     return None
 
@@ -80,21 +36,22 @@ def load_existing_trackers():
         return
     try:
         with st.spinner("Loading creative trackers..."):
-            service = build('displayvideo', 'v3', credentials=st.session_state.creds)
-            creative = service.advertisers().creatives().get(
-                advertiserId=st.session_state.adv_single,
-                creativeId=st.session_state.creative_single
-            ).execute()
+            cache = default_cache()
+            creative = cache.get(st.session_state.adv_single, st.session_state.creative_single)
+            if creative is None:
+                with service_pool(st.session_state.creds).lease() as service:
+                    creative = fetch_creative_details(service, st.session_state.adv_single, st.session_state.creative_single)
+                cache.put(creative)
 
             st.session_state.tracker_map = detect_tracker_map(creative)
-            reverse_map = {v: k for k, v in st.session_state.tracker_map.items()}
+            labels = reverse_map(st.session_state.tracker_map)
             trackers = creative.get("thirdPartyUrls", [])
             
             processed_trackers = []
             if trackers:
                 for tracker in trackers:
                     api_type = tracker.get('type')
-                    event_type = reverse_map.get(api_type, api_type)
+                    event_type = labels.get(api_type, api_type)
                     processed_trackers.append({
                         'event_type': event_type,
                         'existing_url': tracker.get('url', '')
@@ -133,25 +90,12 @@ def update_creative():
                 edited_df = pd.concat([edited_df, added_df], ignore_index=True)
 
             # Process the reconstructed DataFrame
-            final_trackers = []
-            tracker_map = st.session_state.tracker_map
-
-            for _, row in edited_df.iterrows():
-                event_type_val = row['event_type']
-                url_to_use = row['new_url'].strip() if pd.notna(row['new_url']) and row['new_url'].strip() else row['existing_url']
-                
-                if pd.notna(event_type_val) and pd.notna(url_to_use) and url_to_use:
-                    api_type = tracker_map.get(event_type_val, event_type_val)
-                    final_trackers.append({"type": api_type, "url": str(url_to_use).strip()})
-
-            # Send the update to the API
-            service = build('displayvideo', 'v3', credentials=st.session_state.creds)
-            service.advertisers().creatives().patch(
-                advertiserId=st.session_state.adv_single,
-                creativeId=st.session_state.creative_single,
-                updateMask="thirdPartyUrls",
-                body={"thirdPartyUrls": final_trackers}
-            ).execute()
+            final_trackers = build_final_trackers(edited_df, st.session_state.tracker_map)
+
+            # Send the update to the API; the response refreshes the cache for the reload below
+            with service_pool(st.session_state.creds).lease() as service:
+                updated = patch_creative(service, st.session_state.adv_single, st.session_state.creative_single, final_trackers)
+            default_cache().put(updated)
 
             st.success("✅ Creative updated successfully!")
             load_existing_trackers()
@@ -208,3 +152,7 @@ if creds:
             key="tracker_table_single"
         )
         st.button("Update Creative", on_click=update_creative, type="primary")
+
+    with st.expander("API metrics"):
+        st.caption("Latency, status codes, retries and quota errors per operation and advertiser, since the last reset.")
+        show_api_metrics()